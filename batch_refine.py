@@ -0,0 +1,250 @@
+import json
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from time import perf_counter
+from zone_manager import ZoneManager
+from refinement_engine import refine_zones
+from refinement_cache import RefinementCache
+
+DEFAULT_BATCH_SIZE = 8
+DEFAULT_BATCH_CHARS = 1 << 16
+
+# Per-process state, set up once by init_worker
+_worker_cache = None
+_worker_zone_tokens = None
+
+
+def init_worker(cache_entries=0, zone_tokens=None):
+    """
+    Pool initializer: runs once per worker process. Importing this module
+    already compiled the rule table; the worker keeps its own cache.
+    """
+    global _worker_cache, _worker_zone_tokens
+    _worker_zone_tokens = zone_tokens
+    _worker_cache = RefinementCache(cache_entries) if cache_entries else None
+
+
+def refine_document(text, fused=False, cache=None, zone_tokens=None):
+    """Refine one document. Returns (refined_text, metrics)."""
+    manager = ZoneManager()
+    manager.split_into_zones(text, zone_tokens)
+    refine_zones(manager, fused=fused, cache=cache)
+    return manager.get_combined_text(), manager.get_metrics()
+
+
+def refine_requests(items):
+    """Pool task for (text, fused) pairs, for callers that mix modes."""
+    return [refine_document(text, fused, _worker_cache, _worker_zone_tokens)
+            for text, fused in items]
+
+
+class Throughput:
+    """Documents and input bytes refined, for docs/sec and MB/sec."""
+    def __init__(self):
+        self.documents = 0
+        self.bytes = 0
+        self.started = perf_counter()
+
+    def add(self, documents, nbytes):
+        self.documents += documents
+        self.bytes += nbytes
+
+    def as_dict(self):
+        seconds = perf_counter() - self.started
+        return {
+            'documents': self.documents,
+            'bytes': self.bytes,
+            'seconds': seconds,
+            'docs_per_second': self.documents / seconds if seconds else 0.0,
+            'mb_per_second': self.bytes / seconds / 1e6 if seconds else 0.0,
+        }
+
+
+def make_pool(workers, cache_entries=0, zone_tokens=None):
+    """A pool of refinement workers that can outlive one refine_many call."""
+    return ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                               initargs=(cache_entries, zone_tokens))
+
+
+def _shards(texts, fused, batch_size, batch_chars):
+    """Group documents into pool tasks of up to batch_size documents or batch_chars characters."""
+    batch = []
+    chars = 0
+    nbytes = 0
+    for text in texts:
+        batch.append((text, fused))
+        chars += len(text)
+        nbytes += len(text.encode("utf-8", "surrogatepass"))
+        if len(batch) >= batch_size or chars >= batch_chars:
+            yield batch, nbytes
+            batch = []
+            chars = 0
+            nbytes = 0
+    if batch:
+        yield batch, nbytes
+
+
+def refine_many(texts, fused=False, workers=None, in_flight=None,
+                batch_size=DEFAULT_BATCH_SIZE, cache_entries=0, zone_tokens=None,
+                batch_chars=DEFAULT_BATCH_CHARS, reorder_buffer=None, executor=None,
+                throughput=None):
+    """
+    Refine an iterable of documents, yielding (refined_text, metrics)
+    per document in input order.
+    ``texts`` is consumed lazily: with ``workers`` > 1 (or an
+    ``executor`` from make_pool) documents are sharded into pool tasks of
+    up to ``batch_size`` documents or ``batch_chars`` characters. At most
+    ``in_flight`` tasks (default 4 per worker) run at once, and finished
+    tasks wait in a reorder buffer until the ones before them are done:
+    running plus buffered tasks never exceed ``reorder_buffer`` (default
+    4 x in_flight), so memory stays bounded however long the input is
+    while a slow task does not idle the other workers.
+    Each worker sets up once and keeps an LRU RefinementCache of
+    ``cache_entries`` zones (0: none). ``zone_tokens`` sizes zones by a
+    word budget (see iter_zones). Pass a Throughput as ``throughput`` to
+    count the documents and bytes yielded.
+    """
+    if executor is None and (not workers or workers <= 1):
+        cache = RefinementCache(cache_entries) if cache_entries else None
+        for text in texts:
+            yield refine_document(text, fused, cache, zone_tokens)
+            if throughput is not None:
+                throughput.add(1, len(text.encode("utf-8", "surrogatepass")))
+        return
+
+    if in_flight is None:
+        in_flight = (workers or os.cpu_count() or 1) * 4
+    in_flight = max(1, in_flight)
+    if reorder_buffer is None:
+        reorder_buffer = in_flight * 4
+    reorder_buffer = max(in_flight, reorder_buffer)
+
+    if executor is not None:
+        yield from _run_shards(executor, _shards(texts, fused, batch_size, batch_chars),
+                               in_flight, reorder_buffer, throughput)
+        return
+    with make_pool(workers, cache_entries, zone_tokens) as pool:
+        yield from _run_shards(pool, _shards(texts, fused, batch_size, batch_chars),
+                               in_flight, reorder_buffer, throughput)
+
+
+def _run_shards(pool, shards, in_flight, reorder_buffer, throughput):
+    running = {}  # future -> task number
+    finished = {}  # task number -> (results, input bytes), the reorder buffer
+    submitted = 0
+    next_out = 0
+    exhausted = False
+    while True:
+        while not exhausted and len(running) < in_flight and \
+                len(running) + len(finished) < reorder_buffer:
+            shard = next(shards, None)
+            if shard is None:
+                exhausted = True
+                break
+            batch, nbytes = shard
+            running[pool.submit(refine_requests, batch)] = (submitted, nbytes)
+            submitted += 1
+        if not running:
+            return
+
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            number, nbytes = running.pop(future)
+            finished[number] = (future.result(), nbytes)
+
+        # ---- Release results in input order ----
+        while next_out in finished:
+            results, nbytes = finished.pop(next_out)
+            next_out += 1
+            yield from results
+            if throughput is not None:
+                throughput.add(len(results), nbytes)
+
+
+def read_records(lines, field="text"):
+    """Parse JSONL ``lines`` into records; each needs a string ``field``."""
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"line {line_number}: invalid JSON ({e})")
+        if not isinstance(record, dict) or not isinstance(record.get(field), str):
+            raise ValueError(f"line {line_number}: record has no text field '{field}'")
+        yield record
+
+
+def refine_jsonl(source, out, field="text", **options):
+    """
+    Stream JSONL records from ``source`` to ``out``. Each output record is
+    the input record with the refined text in ``field`` plus "metrics".
+    Returns the number of records written.
+    """
+    records = deque()
+
+    def texts():
+        for record in read_records(source, field):
+            records.append(record)
+            yield record[field]
+
+    count = 0
+    for refined, metrics in refine_many(texts(), **options):
+        record = records.popleft()
+        record[field] = refined
+        record['metrics'] = metrics
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        count += 1
+    return count
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Refine JSONL documents (one JSON object per line)")
+    parser.add_argument("input", nargs="?", help="JSONL input file (default: stdin)")
+    parser.add_argument("-o", "--output", help="JSONL output file (default: stdout)")
+    parser.add_argument("--field", default="text",
+                        help="record field holding the document text (default: text)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="worker processes (default: 1, in-process)")
+    parser.add_argument("--in-flight", type=int,
+                        help="max batches running on the pool (default: 4 per worker)")
+    parser.add_argument("--reorder-buffer", type=int,
+                        help="max batches running or waiting to be written in order "
+                             "(default: 4 x in-flight)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"max documents per pool task (default: {DEFAULT_BATCH_SIZE})")
+    parser.add_argument("--batch-chars", type=int, default=DEFAULT_BATCH_CHARS,
+                        help=f"max characters per pool task (default: {DEFAULT_BATCH_CHARS})")
+    parser.add_argument("--cache-entries", type=int, default=0,
+                        help="per-process zone cache size (default: 0, off)")
+    parser.add_argument("--zone-tokens", type=int, metavar="N",
+                        help="size zones to about N words each (default: by sentence count)")
+    parser.add_argument("--fused", action="store_true",
+                        help="apply all of a zone's fixes in one visit")
+    args = parser.parse_args()
+
+    source = open(args.input, "r", encoding="utf-8") if args.input else sys.stdin
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    throughput = Throughput()
+    try:
+        count = refine_jsonl(source, out, field=args.field, fused=args.fused,
+                             workers=args.workers, in_flight=args.in_flight,
+                             batch_size=max(1, args.batch_size),
+                             batch_chars=max(1, args.batch_chars),
+                             reorder_buffer=args.reorder_buffer,
+                             cache_entries=args.cache_entries,
+                             zone_tokens=args.zone_tokens, throughput=throughput)
+    except ValueError as e:
+        parser.exit(1, f"error: {e}\n")
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if out is not sys.stdout:
+            out.close()
+    rate = throughput.as_dict()
+    print(f"Refined {count:,} records in {rate['seconds']:.2f}s: "
+          f"{rate['docs_per_second']:,.0f} docs/s, {rate['mb_per_second']:.2f} MB/s", file=sys.stderr)
@@ -0,0 +1,239 @@
+import glob
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from zone_node import ZoneNode
+from zone_manager import ZoneManager, iter_sentences
+from smart_refiners import predict_zone_action, apply_zone_action, polish_zone
+from main_showcase import run_refinement
+
+SIZES = {"1K": 1 << 10, "10K": 10 << 10, "100K": 100 << 10,
+         "1M": 1 << 20, "10M": 10 << 20, "100M": 100 << 20}
+DEFAULT_SIZES = "1K,10K,100K,1M"
+MAX_SAMPLES = 100000
+
+# ---- Synthetic corpus ----
+
+def _seed_sentences():
+    """Sentences of the bundled *NODEexample.txt inputs."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    sentences = []
+    for path in sorted(glob.glob(os.path.join(here, "*NODEexample.txt"))):
+        with open(path, "r", encoding="utf-8") as f:
+            sentences.extend(iter_sentences(f))
+    return sentences or ["this is a short sentence that needs some work"]
+
+
+def _roughen(sentence, rng):
+    """Re-introduce the mistakes the refiners fix."""
+    words = sentence.split()
+    roll = rng.random()
+    if roll < 0.3:
+        sentence = sentence.lower()
+    if roll < 0.15:
+        sentence = sentence.rstrip(".!?")
+    if rng.random() < 0.1 and len(words) > 3:
+        i = rng.randrange(1, len(words))
+        words[i] = rng.choice(["dont", "cant", "im", "wont", "isnt"])
+        sentence = " ".join(words)
+    if rng.random() < 0.05:
+        sentence = sentence.replace(" ", "  ", 1)
+    if rng.random() < 0.05:
+        sentence = "my name is " + rng.choice(["alex", "sam", "jordan"]) + " and " + sentence
+    return sentence
+
+
+def make_corpus(size, seed=0):
+    """A document of about ``size`` bytes built from the example inputs."""
+    rng = random.Random(seed)
+    sentences = _seed_sentences()
+    parts = []
+    total = 0
+    while total < size:
+        sentence = _roughen(rng.choice(sentences), rng)
+        parts.append(sentence)
+        total += len(sentence) + 1
+    return " ".join(parts)
+
+
+def _zone_states(text, max_samples):
+    """
+    (text, zone_type, action) for every predict of an iterative run,
+    thinned evenly to at most ``max_samples``.
+    """
+    manager = ZoneManager()
+    manager.split_into_zones(text)
+    states = []
+    for zone in manager.get_all_zones():
+        for _ in range(10):
+            action = predict_zone_action(zone)
+            states.append((zone.text, zone.zone_type, action))
+            if action == "no change":
+                break
+            apply_zone_action(zone, action)
+            polish_zone(zone)
+    if len(states) > max_samples:
+        step = len(states) / max_samples
+        states = [states[int(i * step)] for i in range(max_samples)]
+    return states
+
+# ---- Timing ----
+
+def _time(fn, repeat):
+    """Call ``fn`` ``repeat`` times; fn times its own hot section and returns seconds."""
+    return [fn() for _ in range(repeat)]
+
+
+def _summary(samples, nbytes, calls=None):
+    best = min(samples)
+    result = {
+        "seconds": best,
+        "median": statistics.median(samples),
+        "bytes": nbytes,
+        "mb_per_s": (nbytes / best / 1e6) if best else 0,
+    }
+    if calls:
+        result["calls"] = calls
+        result["ns_per_call"] = best / calls * 1e9
+    return result
+
+
+def bench_size(label, size, repeat, seed, max_samples):
+    text = make_corpus(size, seed)
+    nbytes = len(text.encode("utf-8"))
+    results = {}
+
+    def split():
+        start = time.perf_counter()
+        ZoneManager().split_into_zones(text)
+        return time.perf_counter() - start
+    results["split_into_zones"] = _summary(_time(split, repeat), nbytes)
+
+    states = _zone_states(text, max_samples)
+    state_bytes = sum(len(s[0]) for s in states)
+
+    def predict():
+        zones = [ZoneNode(0, t, zone_type) for t, zone_type, _ in states]
+        start = time.perf_counter()
+        for zone in zones:
+            predict_zone_action(zone)
+        return time.perf_counter() - start
+    results["predict_zone_action"] = _summary(_time(predict, repeat), state_bytes, len(states))
+
+    by_action = {}
+    for t, zone_type, action in states:
+        if action != "no change":
+            by_action.setdefault(action, []).append((t, zone_type))
+    for action, items in sorted(by_action.items()):
+        def apply():
+            zones = [ZoneNode(0, t, zone_type) for t, zone_type in items]
+            start = time.perf_counter()
+            for zone in zones:
+                apply_zone_action(zone, action)
+            return time.perf_counter() - start
+        results[f"apply_zone_action:{action}"] = _summary(
+            _time(apply, repeat), sum(len(t) for t, _ in items), len(items))
+
+    def polish():
+        zones = [ZoneNode(0, t, zone_type) for t, zone_type, _ in states]
+        start = time.perf_counter()
+        for zone in zones:
+            polish_zone(zone)
+        return time.perf_counter() - start
+    results["polish_zone"] = _summary(_time(polish, repeat), state_bytes, len(states))
+
+    def end_to_end():
+        start = time.perf_counter()
+        run_refinement(text)
+        return time.perf_counter() - start
+    results["run_refinement"] = _summary(_time(end_to_end, repeat), nbytes)
+
+    return results
+
+
+def run_benchmarks(sizes, repeat=3, seed=0, max_samples=MAX_SAMPLES, progress=None):
+    """Benchmark every size label; returns the JSON-ready report."""
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+            "repeat": repeat,
+            "seed": seed,
+        },
+        "results": {},
+    }
+    for label in sizes:
+        if progress:
+            progress(label)
+        report["results"][label] = bench_size(label, SIZES[label], repeat, seed, max_samples)
+    return report
+
+# ---- Baseline comparison ----
+
+def compare(report, baseline, threshold=0.10, min_seconds=1e-3):
+    """
+    Compare best times against a previous report.
+    Returns (rows, regressions); a row is (size, name, old, new, ratio).
+    Timings under ``min_seconds`` are too noisy to count as regressions.
+    """
+    rows = []
+    regressions = []
+    for label, benches in report["results"].items():
+        for name, result in benches.items():
+            old = baseline.get("results", {}).get(label, {}).get(name)
+            if not old or not old["seconds"]:
+                continue
+            ratio = result["seconds"] / old["seconds"]
+            row = (label, name, old["seconds"], result["seconds"], ratio)
+            rows.append(row)
+            if ratio > 1 + threshold and result["seconds"] >= min_seconds:
+                regressions.append(row)
+    return rows, regressions
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the splitter, refiners and full pipeline")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES,
+                        help=f"comma-separated sizes from {','.join(SIZES)} (default: {DEFAULT_SIZES})")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per benchmark; the best is reported")
+    parser.add_argument("--seed", type=int, default=0, help="corpus generator seed")
+    parser.add_argument("--max-samples", type=int, default=MAX_SAMPLES,
+                        help="zone states timed per refiner benchmark")
+    parser.add_argument("-o", "--output", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--baseline", help="JSON report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="slowdown ratio counted as a regression (default: 0.10)")
+    args = parser.parse_args()
+
+    sizes = [s.strip().upper() for s in args.sizes.split(",") if s.strip()]
+    unknown = [s for s in sizes if s not in SIZES]
+    if unknown:
+        parser.error(f"unknown sizes: {', '.join(unknown)}")
+
+    report = run_benchmarks(sizes, max(1, args.repeat), args.seed, args.max_samples,
+                            progress=lambda label: print(f"benchmarking {label}...", file=sys.stderr))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows, regressions = compare(report, baseline, args.threshold)
+        for row in rows:
+            label, name, old, new, ratio = row
+            flag = "  REGRESSION" if row in regressions else ""
+            print(f"{label:>5} {name:40} {old * 1e3:10.2f}ms -> {new * 1e3:10.2f}ms  x{ratio:.2f}{flag}",
+                  file=sys.stderr)
+        if regressions:
+            sys.exit(1)
@@ -1,5 +1,12 @@
-from zone_manager import ZoneManager
-from smart_refiners import predict_zone_action, apply_zone_action, polish_zone
+from zone_manager import ZoneManager, ZoneMetrics, iter_zones, STREAM_CHUNK_SIZE
+import hashlib
+import os
+from refinement_engine import (MAX_CYCLES, Budget, Checkpoint, refine_zones,
+                               resume_refinement, run_zone)
+from refinement_events import RefinementEvents, format_debug
+from refinement_cache import RefinementCache, restore_result, zone_result
+from refiner_backends import make_backend
+from smart_refiners import RuleStats, PROCESS_RULE_STATS
 
 def print_header(title):
     """Print formatted header"""
@@ -22,88 +29,138 @@ def visualize_zone_status(zones):
         heat = "🔥" * min(zone.changes_made, 5)
         print(f"    Zone {zone.zone_id} ({zone.zone_type:>10}): {status} {zone.refinement_passes} passes  {heat}")
 
-def run_refinement(text):
+def run_refinement(text, fused=False, workers=None, executor=None,
+                   batch_size=None, events=None, manager=None, cache=None,
+                   zone_tokens=None, backend=None, deadline=None, token_budget=None):
     """
     Backend entry-point for UI.
     Executes the refinement pipeline and returns logs + final output.
+    Pass the ZoneManager of a previous run as ``manager`` to refine an
+    edited document incrementally: unchanged refined zones are reused.
+    Logs are the event records (cycle, visit, action, refined, cycle_end);
+    pass a RefinementEvents as ``events`` to observe them live as well.
+    With fused=True each zone gets all of its fixes in a single visit;
+    workers > 1 (or a ProcessPoolExecutor) refines zones in parallel.
+    A RefinementCache passed as ``cache`` is shared across calls so
+    repeated zones are refined once; its stats are added to the metrics
+    under "cache". ``zone_tokens`` sizes zones by a word budget.
+    A ``backend`` from refiner_backends (e.g. an HTTPBackend in front of
+    a model server) refines the zones in batches instead; its request
+    counters are added under "backend", and the tokens it reports under
+    backend_input_tokens/backend_output_tokens (the other token metrics
+    count words, whatever the backend).
+    ``deadline`` (seconds) and/or ``token_budget`` bound the refinement:
+    worst zones are refined first, and when the budget runs out the
+    partly refined text is returned, with metrics['budget']['unrefined_zones']
+    listing the zones left unfinished. The deadline starts after the text
+    is split into zones; splitting is not covered by it.
     """
     logs = []
-
-    # Capture print output
-    def capture_print(*args):
-        logs.append(" ".join(str(a) for a in args))
-
-    import builtins
-    original_print = builtins.print
-    builtins.print = capture_print
+    if events is None:
+        events = RefinementEvents()
+    record = events.subscribe(logs.append)
 
     try:
-        from zone_manager import ZoneManager
-        from smart_refiners import predict_zone_action, apply_zone_action, polish_zone
+        if manager is None:
+            manager = ZoneManager()
+            manager.split_into_zones(text, zone_tokens)
+            zones = None
+        else:
+            zones = manager.update_text(text)
 
-        manager = ZoneManager()
-        num_zones = manager.split_into_zones(text)
-
-        MAX_CYCLES = 10
-        zones_needing_work = list(manager.get_all_zones())
-        cycle = 0
-
-        while zones_needing_work and cycle < MAX_CYCLES:
-            cycle += 1
-
-            for zone in zones_needing_work[:]:
-
-                # 🔴 NEW: log traversal (node visit)
-                logs.append({
-                    "event": "visit",
-                    "zone": zone.zone_id,
-                    "refined": zone.is_refined
-                })
-
-                if zone.is_refined:
-                    zones_needing_work.remove(zone)
-                    continue
-
-                action = predict_zone_action(zone)
-
-                if action == "no change":
-                    if zone.text.strip().endswith(('.', '!', '?')):
-                        zone.is_refined = True
-                        zones_needing_work.remove(zone)
-
-                        # 🟢 NEW: log refinement completion
-                        logs.append({
-                            "event": "refined",
-                            "zone": zone.zone_id
-                        })
-
-                        continue
-                    else:
-                        zone.text = zone.text.strip() + "."
-                        zone.mark_change()
-                        zone.increment_pass()
-                        continue
-
-                zone.increment_pass()
-                apply_zone_action(zone, action)
-                polish_zone(zone)
-
-                # 🟢 NEW: if zone got refined after changes
-                if zone.is_refined:
-                    logs.append({
-                        "event": "refined",
-                        "zone": zone.zone_id
-                    })
+        budget = None
+        if deadline is not None or token_budget is not None:
+            budget = Budget(deadline, token_budget)
+        refine_zones(manager, fused=fused, workers=workers, executor=executor,
+                     batch_size=batch_size, events=events, zones=zones,
+                     cache=cache, backend=backend, budget=budget)
 
         final_text = manager.get_combined_text()
         metrics = manager.get_metrics()
+        if cache is not None:
+            metrics['cache'] = cache.stats()
+        if backend is not None:
+            metrics['backend'] = backend.stats()
 
         return logs, final_text, metrics
 
     finally:
-        builtins.print = original_print
+        events.unsubscribe(record)
+
+def refine_stream(source, out, chunk_size=STREAM_CHUNK_SIZE, cache=None, zone_tokens=None):
+    """
+    Refine a document of any size zone by zone, writing refined text to
+    ``out`` as soon as each zone is done.
+    Zones are independent, so running each to completion gives the same
+    text and metrics as run_refinement with only one zone in memory.
+    """
+    metrics = ZoneMetrics()
+    stats = RuleStats()
+    cycles = 0
+
+    for zone in iter_zones(source, chunk_size, zone_tokens):
+        if cache is None:
+            cycles = max(cycles, run_zone(zone, stats=stats))
+        else:
+            key = cache.key(zone.text, zone.zone_type, open_edges=zone.open_edges)
+            result = cache.get(key)
+            if result is None:
+                cycles = max(cycles, run_zone(zone, stats=stats))
+                cache.put(key, zone_result(zone, (0, 0, 0)))
+            else:
+                restore_result(zone, result)
+                cycles = max(cycles, 1)
+
+        if zone.zone_id > 1:
+            out.write(" ")
+        out.write(zone.text)
+        metrics.add(zone)
+
+    PROCESS_RULE_STATS.merge(stats)
+    if cache is not None:
+        cache.flush()
+    result = metrics.as_dict()
+    result['cycles'] = cycles
+    result['scanned'] = stats.scanned_dict()
+    result['rules'] = stats.as_dict()
+    if cache is not None:
+        result['cache'] = cache.stats()
+    return result
+
+def refine_checkpointed(path, out, checkpoint_path, interval=60.0, fused=False,
+                        zone_tokens=None):
+    """
+    Refine the file at ``path`` in memory, snapshotting progress to
+    ``checkpoint_path`` every ``interval`` seconds. If that snapshot
+    already exists the run resumes from it instead of starting over;
+    the text written to ``out`` is the same either way. A snapshot of a
+    different input (or mode, or zone budget) raises ValueError. The
+    snapshot is removed once the output is written.
+    """
+    source = {'input': _file_digest(path), 'fused': fused, 'zone_tokens': zone_tokens}
+    checkpoint = Checkpoint(checkpoint_path, interval, source)
+    if os.path.exists(checkpoint_path):
+        manager = resume_refinement(checkpoint_path, checkpoint=checkpoint, source=source)
+    else:
+        manager = ZoneManager()
+        with open(path, "r", encoding="utf-8") as fp:
+            manager.split_stream(fp, zone_tokens=zone_tokens)
+        refine_zones(manager, fused=fused, checkpoint=checkpoint)
+    manager.write_combined_text(out)
+    os.remove(checkpoint_path)
+    return manager.get_metrics()
+
+
+def _file_digest(path, chunk_size=1 << 20):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as fp:
+        for chunk in iter(lambda: fp.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
 
-def main():
+
+def main(fused=False, debug=False, zone_tokens=None, backend=None, deadline=None,
+         token_budget=None):
     # ---- USER INPUT ----
     print("\n🚀 ADVANCED TEXT REFINEMENT SYSTEM")
     print("   Using Circular Linked List with Zonal Processing\n")
@@ -118,7 +175,7 @@ def main():
     
     # Initialize zone manager
     manager = ZoneManager()
-    num_zones = manager.split_into_zones(text)
+    num_zones = manager.split_into_zones(text, zone_tokens)
     
     print(f"\n  ✓ Text split into {num_zones} zones")
     print(f"  ✓ Circular linked list created")
@@ -133,65 +190,33 @@ def main():
     print("\n  Strategy: Process only zones that need refinement")
     print("  Advantage: Skip already-refined zones (unlike traditional re-processing)\n")
     
-    MAX_CYCLES = 10
-    zones_needing_work = list(manager.get_all_zones())
-    cycle = 0
-    
-    while zones_needing_work and cycle < MAX_CYCLES:
-        cycle += 1
-        print(f"\n  ─── Cycle {cycle} ─────")
-        
-        zones_changed = []
-        
-        for zone in zones_needing_work[:]:
-            # Skip if already refined
-            if zone.is_refined:
-                zones_needing_work.remove(zone)
-                continue
-
-            # PREDICT
-            action = predict_zone_action(zone)
-
-            # If nothing to do, check if really complete
-            if action == "no change":
-                # Check if text ends with punctuation
-                if zone.text.strip().endswith(('.', '!', '?')):
-                    zone.is_refined = True
-                    zones_needing_work.remove(zone)
-                    continue
-                else:
-                    # Text doesn't end with punctuation - force add it
-                    print(f"    Zone {zone.zone_id}: add period (forced)  → {zone.text.strip()[:60]}...")
-                    zone.text = zone.text.strip() + "."
-                    zone.mark_change()
-                    zone.increment_pass()
-                    zones_changed.append(zone.zone_id)
-                    
-                    # Now check if complete
-                    if zone.text.strip().endswith(('.', '!', '?')):
-                        zone.is_refined = True
-                    continue
-
-            # APPLY refinement
-            zone.increment_pass()
-            changed = apply_zone_action(zone, action)
-
-            # POLISH
-            polish_changed = polish_zone(zone)
-
-            if changed or polish_changed:
-                zones_changed.append(zone.zone_id)
-                print(f"    Zone {zone.zone_id}: {action:20} → {zone.text[:60]}...")
-            
-            
-        
-        # Show progress
-        progress = print_progress_bar(num_zones - len(zones_needing_work), num_zones)
-        print(f"\n  Progress: {progress} ({num_zones - len(zones_needing_work)}/{num_zones} zones refined)")
+    events = RefinementEvents()
+
+    def show_cycle(record):
+        print(f"\n  ─── Cycle {record['cycle']} ─────")
+
+    def show_action(record):
+        if record["changed"]:
+            print(f"    Zone {record['zone']}: {record['action']:20} → {record['text'][:60]}...")
+
+    def show_progress(record):
+        refined = record["zones"] - record["pending"]
+        progress = print_progress_bar(refined, num_zones)
+        print(f"\n  Progress: {progress} ({refined}/{num_zones} zones refined)")
         
-        if not zones_needing_work or all(zone.is_refined for zone in manager.get_all_zones()):
-            print(f"\n  ✓ All zones refined! Stopping early at cycle {cycle}")
-            break
+        if not record["pending"]:
+            print(f"\n  ✓ All zones refined! Stopping early at cycle {record['cycle']}")
+
+    events.subscribe(show_cycle, ["cycle"])
+    events.subscribe(show_action, ["action"])
+    events.subscribe(show_progress, ["cycle_end"])
+    if debug:
+        events.subscribe(lambda record: print(format_debug(record)), ["debug"])
+
+    budget = None
+    if deadline is not None or token_budget is not None:
+        budget = Budget(deadline, token_budget)
+    cycle = refine_zones(manager, fused=fused, events=events, backend=backend, budget=budget)
     
     print_header("RESULTS")
     
@@ -206,6 +231,23 @@ def main():
     print(f"    Zonal Approach:       {metrics['tokens_actual']:,} tokens processed")
     print(f"    Efficiency Gain:      {metrics['efficiency_gain']:.1f}%")
     print(f"    Total Changes:        {metrics['total_changes']}")
+    print(f"    Measured:             {metrics['tokens_scanned']:,} tokens scanned by the refiners, "
+          f"{metrics['tokens_processed']:,} tokens in applied actions")
+    print(f"    Time:                 {metrics['wall_seconds'] * 1e3:.1f}ms wall, "
+          f"{metrics['cpu_seconds'] * 1e3:.1f}ms CPU over {metrics['cycles']} cycles")
+    if backend is not None:
+        usage = backend.stats()
+        print(f"    Backend:              {usage['name']}, {usage['requests']:,} requests "
+              f"for {usage['zones']:,} zones")
+        if metrics['backend_input_tokens'] or metrics['backend_output_tokens']:
+            print(f"    Backend Usage:        {metrics['backend_input_tokens']:,} input tokens, "
+                  f"{metrics['backend_output_tokens']:,} output tokens (as reported)")
+    if budget is not None and budget.exhausted:
+        print(f"    Budget:               ran out with {len(budget.unrefined)} zones unrefined "
+              f"({', '.join(map(str, budget.unrefined))})")
+    if metrics['stalled_zones']:
+        print(f"    Stalled:              {metrics['stalled_zones']} zones stopped early "
+              f"({metrics['fixed_points']} fixed points, {metrics['oscillations']} oscillations)")
     
     print_header("COMPARISON: TRADITIONAL vs ZONAL")
     
@@ -230,4 +272,76 @@ def main():
     print(f"  Cycles:   {cycle}/{MAX_CYCLES}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Zonal text refinement showcase")
+    parser.add_argument("--fused", action="store_true",
+                        help="apply all of a zone's fixes in one visit")
+    parser.add_argument("--debug", action="store_true",
+                        help="print the refiners' debug events")
+    parser.add_argument("--stream", metavar="INPUT",
+                        help="refine a text file zone by zone instead of prompting")
+    parser.add_argument("--output", metavar="OUTPUT",
+                        help="file for --stream output (default: stdout)")
+    parser.add_argument("--cache", metavar="DB",
+                        help="sqlite file that keeps --stream refinements across runs")
+    parser.add_argument("--zone-tokens", type=int, metavar="N",
+                        help="size zones to about N words each (default: by sentence count)")
+    parser.add_argument("--deadline", type=float, metavar="MS",
+                        help="stop refining after MS milliseconds, keeping the text so far")
+    parser.add_argument("--token-budget", type=int, metavar="N",
+                        help="stop refining after visiting N tokens of zone text")
+    parser.add_argument("--backend", metavar="URL",
+                        help="refine through a server (http://host:port or unix:/path) "
+                             "instead of the built-in refiners")
+    parser.add_argument("--checkpoint", metavar="FILE",
+                        help="snapshot --stream progress to FILE and resume from it if it exists")
+    parser.add_argument("--checkpoint-interval", type=float, default=60.0, metavar="SECONDS",
+                        help="seconds between --checkpoint snapshots (default: 60)")
+    args = parser.parse_args()
+
+    if args.stream and args.checkpoint:
+        try:
+            if args.output:
+                with open(args.output, "w", encoding="utf-8") as out:
+                    metrics = refine_checkpointed(args.stream, out, args.checkpoint,
+                                                  args.checkpoint_interval, fused=args.fused,
+                                                  zone_tokens=args.zone_tokens)
+            else:
+                metrics = refine_checkpointed(args.stream, sys.stdout, args.checkpoint,
+                                              args.checkpoint_interval, fused=args.fused,
+                                              zone_tokens=args.zone_tokens)
+                print()
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"Refined {metrics['zones']:,} zones, {metrics['total_changes']:,} changes", file=sys.stderr)
+    elif args.stream:
+        cache = RefinementCache(path=args.cache) if args.cache else None
+        try:
+            with open(args.stream, "r", encoding="utf-8") as source:
+                if args.output:
+                    with open(args.output, "w", encoding="utf-8") as out:
+                        metrics = refine_stream(source, out, cache=cache,
+                                                zone_tokens=args.zone_tokens)
+                else:
+                    metrics = refine_stream(source, sys.stdout, cache=cache,
+                                            zone_tokens=args.zone_tokens)
+                    print()
+        finally:
+            if cache is not None:
+                cache.close()
+        print(f"Refined {metrics['zones']:,} zones, {metrics['total_changes']:,} changes", file=sys.stderr)
+        if cache is not None:
+            stats = metrics['cache']
+            print(f"Cache: {stats['hit_rate']:.1f}% hits, {stats['evictions']:,} evictions, "
+                  f"{stats['bytes_used']:,} bytes", file=sys.stderr)
+    else:
+        backend = make_backend(args.backend) if args.backend else None
+        try:
+            deadline = args.deadline / 1000 if args.deadline is not None else None
+            main(fused=args.fused, debug=args.debug, zone_tokens=args.zone_tokens,
+                 backend=backend, deadline=deadline, token_budget=args.token_budget)
+        finally:
+            if backend is not None:
+                backend.close()
\ No newline at end of file
@@ -0,0 +1,165 @@
+import hashlib
+import sqlite3
+from collections import OrderedDict
+from smart_refiners import RULESET_VERSION
+
+
+class RefinementCache:
+    """
+    Content-addressed memo of whole-zone refinement results.
+    Keys hash the zone text, zone type, refinement mode (and open
+    sentence edges, and the refiner backend unless it is the built-in
+    one) and RULESET_VERSION; values hold the refined text plus the pass, change
+    and token counts the refinement added, whether it converged and, if
+    it stalled instead, how.
+
+    Entries live in an in-memory LRU bounded by ``max_entries``. With a
+    ``path``, an sqlite file backs the LRU: evicted and new entries stay
+    on disk and are promoted again on a hit, across runs. Disk writes are
+    committed every ``commit_every`` new entries and on flush(), which
+    refinement runs call when they finish.
+    """
+    def __init__(self, max_entries=10000, path=None, commit_every=1000):
+        self.max_entries = max_entries
+        self.commit_every = commit_every
+        self._uncommitted = 0
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_used = 0
+        self._db = None
+        if path is not None:
+            self._db = sqlite3.connect(path)
+            columns = [row[1] for row in self._db.execute("PRAGMA table_info(refinements)")]
+            if columns and "stall" not in columns:
+                # Written before results kept the stall state; start over
+                self._db.execute("DROP TABLE refinements")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS refinements ("
+                "key BLOB PRIMARY KEY, text TEXT, passes INTEGER, changes INTEGER, "
+                "tokens INTEGER, refined INTEGER, stall TEXT)"
+            )
+
+    @staticmethod
+    def key(text, zone_type, fused=False, open_edges=(), backend=None):
+        mode = "fused" if fused else "iterative"
+        if open_edges:
+            mode += "+" + ",".join(open_edges)
+        if backend:
+            mode += "@" + backend
+        raw = f"{RULESET_VERSION}\0{mode}\0{zone_type}\0{text}".encode("utf-8", "surrogatepass")
+        return hashlib.blake2b(raw, digest_size=16).digest()
+
+    def get(self, key):
+        """Return the cached result tuple for ``key``, or None."""
+        result = self._entries.get(key)
+        if result is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+        if self._db is not None:
+            row = self._db.execute(
+                "SELECT text, passes, changes, tokens, refined, stall "
+                "FROM refinements WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                result = (row[0], row[1], row[2], row[3], bool(row[4]), row[5])
+                self._remember(key, result)
+                self.hits += 1
+                self.disk_hits += 1
+                return result
+
+        self.misses += 1
+        return None
+
+    def put(self, key, result):
+        """Store (text, passes, changes, tokens, refined, stall) under ``key``."""
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return
+        self._remember(key, result)
+        if self._db is not None:
+            self._db.execute(
+                "INSERT OR REPLACE INTO refinements VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key,) + tuple(result)
+            )
+            self._uncommitted += 1
+            if self._uncommitted >= self.commit_every:
+                self.flush()
+
+    def _remember(self, key, result):
+        self._entries[key] = result
+        self.bytes_used += _entry_size(key, result)
+        while len(self._entries) > self.max_entries:
+            old_key, old_result = self._entries.popitem(last=False)
+            self.bytes_used -= _entry_size(old_key, old_result)
+            self.evictions += 1
+
+    def flush(self):
+        if self._db is not None and self._uncommitted:
+            self._db.commit()
+            self._uncommitted = 0
+
+    def close(self):
+        if self._db is not None:
+            self.flush()
+            self._db.close()
+            self._db = None
+
+    def stats(self):
+        """Counters reported next to get_metrics()."""
+        lookups = self.hits + self.misses
+        stats = {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits / lookups * 100) if lookups else 0,
+            'evictions': self.evictions,
+            'entries': len(self._entries),
+            'bytes_used': self.bytes_used,
+        }
+        if self._db is not None:
+            page_count = self._db.execute("PRAGMA page_count").fetchone()[0]
+            page_size = self._db.execute("PRAGMA page_size").fetchone()[0]
+            stats['disk_bytes'] = page_count * page_size
+        return stats
+
+
+def _entry_size(key, result):
+    # Encoded length, not sys.getsizeof: a str grows once sqlite binds it
+    # (it caches its UTF-8 form), so evictions would subtract more than
+    # was added
+    return len(key) + len(result[0].encode("utf-8", "surrogatepass"))
+
+
+def zone_result(zone, start):
+    """
+    Result tuple for ``zone`` after a refinement that began with the
+    counters in ``start`` (passes, changes, tokens).
+    """
+    return (
+        zone.text,
+        zone.refinement_passes - start[0],
+        zone.changes_made - start[1],
+        zone.tokens_processed - start[2],
+        zone.is_refined,
+        zone.stall
+    )
+
+
+def zone_counters(zone):
+    return (zone.refinement_passes, zone.changes_made, zone.tokens_processed)
+
+
+def restore_result(zone, result):
+    """Apply a cached result tuple to ``zone``."""
+    text, passes, changes, tokens, refined, stall = result
+    zone.text = text
+    zone.refinement_passes += passes
+    zone.changes_made += changes
+    zone.tokens_processed += tokens
+    zone.is_refined = refined
+    zone.stall = stall
@@ -0,0 +1,535 @@
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter, thread_time
+from zone_node import ZoneNode
+from zone_manager import ZoneManager
+from refinement_events import RefinementEvents, wants
+from zone_scheduler import ActiveRing
+from refinement_cache import restore_result, zone_counters, zone_result
+from smart_refiners import (predict_zone_action, predict_zone_actions,
+                            apply_zone_action, polish_zone,
+                            refine_zone, edit_zone_text, RuleStats, PROCESS_RULE_STATS,
+                            ACTION_REENABLES, count_zone_issues)
+
+MAX_CYCLES = 10
+
+
+def visit_zone(zone, fused=False, events=None, stats=None, action=None):
+    """
+    One visit of a zone during a refinement cycle.
+    Rule counters go to ``stats`` (a RuleStats) when given; the visit's
+    wall and CPU time are added to the zone. An iterative visit takes
+    ``action`` when it was already predicted for the zone's current text.
+    Returns True once the zone can leave the work list: it is refined,
+    or it stalled (zone.stall is set, see _stalled).
+    """
+    wall = perf_counter()
+    cpu = thread_time()
+    done = _visit(zone, fused, events, stats, action)
+    zone.cpu_time += thread_time() - cpu
+    zone.wall_time += perf_counter() - wall
+    return done
+
+
+def _visit(zone, fused, events, stats, action):
+    if fused:
+        # One visit runs the zone to completion (or the cycle budget)
+        actions, converged = refine_zone(zone, MAX_CYCLES, events, stats)
+        if actions:
+            zone.increment_pass()
+        zone.is_refined = converged
+        return True
+
+    if action is None:
+        action = predict_zone_action(zone, events, stats)
+    before = zone.text
+
+    if action == "no change":
+        if before.strip().endswith(('.', '!', '?')) or "end" in zone.open_edges:
+            zone.is_refined = True
+            zone.text_hashes = ()
+            return True
+        edit_zone_text(zone, before.strip() + ".", ACTION_REENABLES["add period"])
+        zone.mark_change()
+        zone.increment_pass()
+        if wants(events, "action"):
+            events.emit("action", zone=zone.zone_id, action="add period",
+                        changed=True, text=zone.text)
+        return _stalled(zone, before)
+
+    zone.increment_pass()
+    changed = apply_zone_action(zone, action, events, stats)
+    changed = polish_zone(zone, stats) or changed
+    if wants(events, "action"):
+        events.emit("action", zone=zone.zone_id, action=action,
+                    changed=changed, text=zone.text)
+    return _stalled(zone, before)
+
+
+def _stalled(zone, before):
+    """
+    Predictions depend only on the zone's text, so a visit that leaves
+    the text unchanged (a fixed point) or returns it to an earlier state
+    (A -> B -> A) would repeat until MAX_CYCLES. Marks zone.stall and
+    returns True for such a zone.
+    """
+    text = zone.text
+    if text == before:
+        zone.stall = "fixed point"
+    else:
+        seen = zone.text_hashes + (_text_digest(before),)
+        if _text_digest(text) not in seen:
+            zone.text_hashes = seen
+            return False
+        zone.stall = "oscillation"
+    zone.text_hashes = ()
+    return True
+
+
+def _text_digest(text):
+    # Stable across processes (unlike hash()), so checkpoints can keep it
+    return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=8).digest()
+
+
+def run_zone(zone, fused=False, events=None, stats=None):
+    """
+    Give one zone every visit the cycle loop would give it.
+    Zones never look at their neighbours, so this yields the same zone
+    state as the loop. Returns the number of visits.
+    """
+    for visit in range(1, MAX_CYCLES + 1):
+        if visit_zone(zone, fused, events, stats):
+            return visit
+    return MAX_CYCLES
+
+
+class Checkpoint:
+    """
+    Periodic snapshots of a serial refine_zones run to ``path``, at most
+    every ``interval`` seconds and once more when the run ends (see
+    ZoneManager.write_checkpoint), that one marked complete unless a
+    budget cut the run short. ``source`` identifies the input and is
+    stored with each snapshot. resume_refinement picks a run up from
+    its last snapshot.
+    """
+    def __init__(self, path, interval=60.0, source=None):
+        self.path = path
+        self.interval = interval
+        self.source = source
+        self.saves = 0
+        self._last = perf_counter()
+
+    def due(self):
+        return perf_counter() - self._last >= self.interval
+
+    def save(self, manager, cycle, pending, visited, fused, complete=False):
+        manager.write_checkpoint(self.path, cycle, pending, visited, fused,
+                                 self.source, complete)
+        self.saves += 1
+        self._last = perf_counter()
+
+
+class Budget:
+    """
+    A limit on one serial refine_zones run, for callers that need an
+    answer in time: ``seconds`` of wall time from when the Budget is
+    made and/or ``tokens`` of zone text visited (each visit costs the
+    zone's token count; ordering zones by their issues is not charged).
+    Past the deadline the run stops before the next visit; a zone too
+    big for the tokens left is skipped for smaller ones. The text refined
+    so far is kept, and ``unrefined`` lists the ids of the zones left
+    unfinished. ``clock`` tells the time in seconds (tests pass a fake).
+    """
+    def __init__(self, seconds=None, tokens=None, clock=perf_counter):
+        self.seconds = seconds
+        self.tokens = tokens
+        self.clock = clock
+        self.started = clock()
+        self.deadline = None if seconds is None else self.started + seconds
+        self.tokens_spent = 0
+        self.exhausted = False  # some zone went without a visit it needed
+        self.timed_out = False
+        self.unrefined = []
+
+    def expired(self, share=1.0):
+        """True once ``share`` of the time budget has passed."""
+        if self.deadline is None:
+            return False
+        if self.clock() < self.started + self.seconds * share:
+            return False
+        if share >= 1.0:
+            self.timed_out = self.exhausted = True
+        return True
+
+    def allows(self, tokens):
+        """Charge a visit of ``tokens``; False (and exhausted) if it is over budget."""
+        if self.expired() or (self.tokens is not None and self.tokens_spent + tokens > self.tokens):
+            self.exhausted = True
+            return False
+        self.tokens_spent += tokens
+        return True
+
+    def as_dict(self):
+        return {
+            'seconds': self.seconds,
+            'tokens': self.tokens,
+            'tokens_spent': self.tokens_spent,
+            'exhausted': self.exhausted,
+            'timed_out': self.timed_out,
+            'unrefined_zones': self.unrefined,
+        }
+
+
+def resume_refinement(path, events=None, checkpoint=None, cache=None, source=None):
+    """
+    Finish a run from the snapshot at ``path``: zones continue from their
+    saved text and counters, and the interrupted cycle skips the zones it
+    had already visited, so the result matches an uninterrupted run.
+    With ``source``, a snapshot written for another source (see
+    Checkpoint) raises ValueError. Returns the ZoneManager.
+    """
+    manager, state = ZoneManager.read_checkpoint(path)
+    if source is not None and state['source'] != source:
+        raise ValueError(f"Checkpoint {path} was written for a different input")
+    refine_zones(manager, fused=state['fused'], events=events, cache=cache,
+                 checkpoint=checkpoint, resume=state)
+    return manager
+
+
+def refine_zones(manager, fused=False, workers=None, executor=None,
+                 batch_size=None, events=None, zones=None, cache=None,
+                 checkpoint=None, resume=None, backend=None, budget=None):
+    """
+    Run refinement cycles over the manager's zones (or just ``zones``,
+    in document order), reporting progress through ``events`` (a
+    RefinementEvents).
+    With ``workers`` > 1 (or an ``executor``) zones are refined in batches
+    on a process pool and written back in order; zone state, metrics and
+    the cycle/visit/action/refined events are the same as in serial mode
+    (debug events are not collected from the pool).
+    A ``backend`` (see refiner_backends) refines zones the same way, in
+    batches of ``batch_size`` (default: the backend's) sent to it instead
+    of the pool; the input/output tokens it reports for the run go to
+    manager.run_stats (backend_input_tokens, backend_output_tokens).
+    With a RefinementCache as ``cache``, a zone whose text was refined
+    before takes the cached result on its first visit (no action events)
+    and every zone refined here is added to the cache (and committed to
+    its disk tier when the run ends).
+    Per-rule counters are added to manager.rule_stats and to the
+    process-wide PROCESS_RULE_STATS; the run's cycle count and wall/CPU
+    times (per cycle in serial mode) go to manager.run_stats.
+    A Checkpoint as ``checkpoint`` snapshots a serial run as it goes;
+    ``resume`` is the state ZoneManager.read_checkpoint returned.
+    Under a Budget as ``budget`` each cycle visits the zones with the most
+    rule issues first, and the run stops early once the budget is spent;
+    the budget's summary goes to manager.run_stats['budget'].
+    Returns the number of cycles.
+    """
+    parallel = executor is not None or (workers and workers > 1) or backend is not None
+    if parallel and (checkpoint is not None or resume is not None or budget is not None):
+        raise ValueError("Checkpoints and budgets need serial refinement "
+                         "(no workers, executor or backend)")
+    if events is None:
+        events = RefinementEvents()
+    stats = RuleStats()
+    cycle_times = []
+    wall = perf_counter()
+    cpu = thread_time()
+    cycles = 0
+    usage = {'input_tokens': 0, 'output_tokens': 0}
+
+    try:
+        if parallel:
+            if zones is None:
+                zones = manager.get_all_zones()
+            cycles, worker_cpu = _refine_parallel(zones, fused, workers, executor,
+                                                  batch_size, events, cache, stats,
+                                                  backend, usage)
+            # Count the pool's CPU time along with this thread's
+            cpu -= worker_cpu
+        else:
+            cycles = _refine_serial(manager, fused, events, zones, cache, stats,
+                                    cycle_times, checkpoint, resume, budget)
+        return cycles
+    finally:
+        manager.rule_stats.merge(stats)
+        PROCESS_RULE_STATS.merge(stats)
+        if cache is not None:
+            cache.flush()
+        manager.run_stats = {
+            'cycles': cycles,
+            'wall_seconds': perf_counter() - wall,
+            'cpu_seconds': thread_time() - cpu,
+            'cycle_times': cycle_times,
+            'budget': budget.as_dict() if budget is not None else None,
+            'backend_input_tokens': usage['input_tokens'],
+            'backend_output_tokens': usage['output_tokens'],
+        }
+
+
+def _refine_serial(manager, fused, events, zones, cache, stats, cycle_times,
+                   checkpoint=None, resume=None, budget=None):
+    skip = set()  # zones the resumed cycle had visited before the snapshot
+    if resume is not None:
+        ring = ActiveRing(resume['pending'])
+        ring.cycle = resume['cycle']
+        skip = resume['visited']
+    elif zones is None:
+        ring = ActiveRing.from_head(manager.head)
+    else:
+        ring = ActiveRing(zones)
+    total = len(ring)
+    started = {}
+    progressed = True
+    if budget is not None:
+        # Counted once: each later change is taken to fix one issue.
+        # Counting stops at half the time budget; zones it did not reach
+        # follow the scored ones in document order.
+        issues = {}
+        for zone in ring:
+            if budget.expired(0.5):
+                break
+            issues[zone] = count_zone_issues(zone)
+
+    while ring and ring.cycle < MAX_CYCLES and progressed:
+        if budget is not None:
+            if budget.expired():
+                break
+            # Most issues first, so a short budget goes where it fixes most
+            cycle = ring.cycle
+            ring = ActiveRing(sorted(ring, key=lambda zone: zone.changes_made - issues.get(zone, 0)))
+            ring.cycle = cycle
+            # A cycle in which every zone was too big for the tokens left
+            # ends the run
+            progressed = False
+        events.emit("cycle", cycle=ring.cycle + 1, pending=len(ring))
+        visited = len(ring)
+        wall = perf_counter()
+        cpu = thread_time()
+
+        # Zones only change on their own visit, so the whole cycle's
+        # predictions can be made up front in one batch (after the first
+        # cycle's cache lookups, and unless debug events are wanted or a
+        # budget may stop the cycle before most zones are visited)
+        actions = {}
+        if (not fused and budget is None and (cache is None or ring.cycle)
+                and not wants(events, "debug")):
+            pending = [zone for zone in ring if not (zone.is_refined or zone in skip)]
+            actions = dict(zip(pending, predict_zone_actions(pending, stats)))
+        visited_now = set()
+
+        for zone in ring.sweep():
+            if checkpoint is not None and checkpoint.due():
+                checkpoint.save(manager, ring.cycle - 1, ring, visited_now | skip, fused)
+            if zone in skip:
+                continue
+            if budget is not None and not zone.is_refined:
+                if not budget.allows(zone.count_tokens()):
+                    if budget.timed_out:
+                        break
+                    continue  # too big for the tokens left; smaller zones may fit
+                progressed = True
+
+            # log traversal (node visit)
+            events.emit("visit", zone=zone.zone_id, refined=zone.is_refined)
+
+            if zone.is_refined:
+                ring.retire(zone)
+                continue
+
+            if cache is not None and ring.cycle == 1:
+                key = cache.key(zone.text, zone.zone_type, fused, zone.open_edges)
+                result = cache.get(key)
+                if result is not None:
+                    restore_result(zone, result)
+                    ring.retire(zone)
+                    if zone.is_refined:
+                        events.emit("refined", zone=zone.zone_id)
+                    elif zone.stall is not None:
+                        events.emit("stalled", zone=zone.zone_id, reason=zone.stall)
+                    continue
+                started[zone] = (key, zone_counters(zone))
+
+            if visit_zone(zone, fused, events, stats, actions.get(zone)):
+                ring.retire(zone)
+                if zone in started:
+                    # Store now so repeats later in this document hit too
+                    key, start = started.pop(zone)
+                    cache.put(key, zone_result(zone, start))
+
+                # log refinement completion
+                if zone.is_refined:
+                    events.emit("refined", zone=zone.zone_id)
+                elif zone.stall is not None:
+                    events.emit("stalled", zone=zone.zone_id, reason=zone.stall)
+            elif checkpoint is not None:
+                visited_now.add(zone)
+        skip = set()
+
+        cycle_times.append({
+            'cycle': ring.cycle,
+            'zones': visited,
+            'wall_seconds': perf_counter() - wall,
+            'cpu_seconds': thread_time() - cpu,
+        })
+        events.emit("cycle_end", cycle=ring.cycle, pending=len(ring),
+                    zones=total)
+
+    if budget is not None:
+        budget.unrefined = sorted(zone.zone_id for zone in ring if not zone.is_refined)
+        if budget.exhausted:
+            events.emit("budget", cycle=ring.cycle, unrefined=len(budget.unrefined))
+
+    # Zones that used up every cycle are final as well (unless the
+    # budget may have cut them short)
+    if budget is None or not budget.exhausted:
+        for zone, (key, start) in started.items():
+            cache.put(key, zone_result(zone, start))
+
+    if checkpoint is not None:
+        checkpoint.save(manager, ring.cycle, ring, (), fused,
+                        complete=budget is None or not budget.exhausted)
+
+    return ring.cycle
+
+
+def refine_batch(batch, fused, record_actions):
+    """
+    Process-pool worker: refine (text, zone_type, open_edges) zones independently.
+    Returns the per-zone results and the batch's RuleStats state.
+    Each result is (text, passes, changes, tokens_processed, is_refined,
+    visits, actions, wall_time, cpu_time, stall).
+    """
+    stats = RuleStats()
+    results = []
+    for text, zone_type, open_edges in batch:
+        zone = ZoneNode(0, text, zone_type)
+        zone.open_edges = open_edges
+        actions = []
+        events = None
+        if record_actions:
+            events = RefinementEvents()
+            events.subscribe(actions.append, ["action"])
+
+        visits = run_zone(zone, fused, events, stats)
+        results.append((
+            zone.text,
+            zone.refinement_passes,
+            zone.changes_made,
+            zone.tokens_processed,
+            zone.is_refined,
+            visits,
+            [(r["action"], r["changed"], r["text"]) for r in actions],
+            zone.wall_time,
+            zone.cpu_time,
+            zone.stall
+        ))
+    return results, stats.state()
+
+
+def _refine_parallel(zones, fused, workers, executor, batch_size, events,
+                     cache=None, stats=None, backend=None, usage=None):
+    """
+    Returns (cycles, CPU seconds the pool or backend spent on zones).
+    The token usage a backend reports is added to ``usage``.
+    """
+    if not zones:
+        return 0, 0.0
+
+    pending = [zone for zone in zones if not zone.is_refined]
+    # Already-refined zones are visited once and dropped, as in the loop
+    visits = {zone: 1 for zone in zones if zone.is_refined}
+    prerefined = set(visits)
+    actions = {}
+
+    # ---- Cache hits never reach the pool ----
+    cached = set()
+    keys = {}
+    worker_cpu = 0.0
+    if cache is not None:
+        misses = []
+        tag = backend.cache_tag if backend is not None else None
+        for zone in pending:
+            key = cache.key(zone.text, zone.zone_type, fused, zone.open_edges, tag)
+            result = cache.get(key)
+            if result is None:
+                keys[zone] = key
+                misses.append(zone)
+            else:
+                restore_result(zone, result)
+                visits[zone] = 1
+                cached.add(zone)
+        pending = misses
+
+    if pending:
+        if batch_size is None and backend is not None:
+            batch_size = backend.batch_size
+        elif batch_size is None:
+            # A few batches per worker keeps the pool busy without tiny tasks
+            pool_size = workers or os.cpu_count() or 1
+            batch_size = max(1, -(-len(pending) // (pool_size * 4)))
+
+        batches = [
+            [(zone.text, zone.zone_type, zone.open_edges) for zone in pending[i:i + batch_size]]
+            for i in range(0, len(pending), batch_size)
+        ]
+        fused_flags = [fused] * len(batches)
+        record_flags = [events.wants("action")] * len(batches)
+
+        if backend is not None:
+            replies = backend.map(batches, fused, events.wants("action"))
+            batch_results = [(results, rules) for results, rules, _ in replies]
+            for _, _, reported in replies:
+                for key, value in (reported or {}).items():
+                    usage[key] = usage.get(key, 0) + value
+        elif executor is None:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                batch_results = list(pool.map(refine_batch, batches, fused_flags, record_flags))
+        else:
+            batch_results = list(executor.map(refine_batch, batches, fused_flags, record_flags))
+
+        # ---- Stitch results back into the circular list, in order ----
+        if stats is not None:
+            for _, state in batch_results:
+                stats.merge(state)
+        results = (result for batch, _ in batch_results for result in batch)
+        for zone, result in zip(pending, results):
+            (zone.text, zone.refinement_passes, zone.changes_made,
+             zone.tokens_processed, zone.is_refined, visits[zone],
+             actions[zone], wall_time, cpu_time, zone.stall) = result
+            zone.wall_time += wall_time
+            zone.cpu_time += cpu_time
+            worker_cpu += cpu_time
+            if cache is not None:
+                cache.put(keys[zone], result[:5] + (zone.stall,))
+
+    # ---- Replay the events in serial (cycle-major) order ----
+    # Iterative visits apply one action each; a fused visit applies them all.
+    cycles = max(visits.values())
+    for cycle in range(1, cycles + 1):
+        remaining = [zone for zone in zones if visits[zone] >= cycle]
+        events.emit("cycle", cycle=cycle, pending=len(remaining))
+
+        for zone in remaining:
+            events.emit("visit", zone=zone.zone_id, refined=zone in prerefined)
+            zone_actions = actions.get(zone, [])
+            replay = zone_actions if fused else zone_actions[cycle - 1:cycle]
+            for action, changed, text in replay:
+                events.emit("action", zone=zone.zone_id, action=action,
+                            changed=changed, text=text)
+            if visits[zone] == cycle and zone not in prerefined:
+                if zone.is_refined:
+                    events.emit("refined", zone=zone.zone_id)
+                elif zone.stall is not None:
+                    events.emit("stalled", zone=zone.zone_id, reason=zone.stall)
+
+        # Only a zone that ran out of cycles stays listed after its last visit
+        still_pending = sum(
+            1 for zone in remaining
+            if visits[zone] > cycle
+            or not (zone.is_refined or zone.stall or fused or zone in cached)
+        )
+        events.emit("cycle_end", cycle=cycle, pending=still_pending, zones=len(zones))
+
+    return cycles, worker_cpu
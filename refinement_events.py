@@ -0,0 +1,73 @@
+class RefinementEvents:
+    """
+    Observer hub for refinement events.
+    Subscribers receive plain dict records such as
+    {"event": "visit", "zone": 3, "refined": False}.
+
+    Events:
+      cycle      - a refinement cycle starts          (cycle, pending)
+      visit      - a zone is visited                  (zone, refined)
+      action     - an action was applied to a zone    (zone, action, changed, text)
+      refined    - a zone is finished                 (zone)
+      stalled    - a zone stopped without converging  (zone, reason)
+      cycle_end  - a refinement cycle ended           (cycle, pending, zones)
+      budget     - the run's budget ran out            (cycle, unrefined)
+      debug      - refiner internals                  (zone, stage, text, ...)
+
+    Emitters call wants() before building a record, so an event nobody
+    subscribed to costs a dict lookup and no formatting.
+    """
+    EVENTS = ("cycle", "visit", "action", "refined", "stalled", "cycle_end", "budget", "debug")
+
+    def __init__(self):
+        self._subscribers = {}
+
+    def subscribe(self, callback, events=None):
+        """Call ``callback(record)`` for the given events (default: all but debug)."""
+        if events is None:
+            events = [event for event in self.EVENTS if event != "debug"]
+        for event in events:
+            if event not in self.EVENTS:
+                raise ValueError(f"Unknown refinement event: {event}")
+            self._subscribers.setdefault(event, []).append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        # ==, not is: each ``obj.method`` lookup makes a new bound method
+        for event in list(self._subscribers):
+            callbacks = [cb for cb in self._subscribers[event] if cb != callback]
+            if callbacks:
+                self._subscribers[event] = callbacks
+            else:
+                del self._subscribers[event]
+
+    def wants(self, event):
+        return event in self._subscribers
+
+    def emit(self, event, **fields):
+        callbacks = self._subscribers.get(event)
+        if callbacks:
+            record = {"event": event}
+            record.update(fields)
+            for callback in callbacks:
+                callback(record)
+
+
+def wants(events, event):
+    """True when ``events`` (a RefinementEvents or None) has subscribers for ``event``."""
+    return events is not None and event in events._subscribers
+
+
+def format_debug(record):
+    """Render a debug record the way the refiners used to print it."""
+    text = record["text"]
+    stage = record["stage"]
+    if stage == "predict":
+        stripped = text.strip()
+        last = stripped[-1] if stripped else 'EMPTY'
+        return f"    [PREDICT DEBUG] Checking zone: '{text[:50]}...' | Last 5 chars: '{text[-5:]}' | Stripped last char: '{last}'"
+    if stage == "needs period":
+        return f"    [PERIOD DEBUG] Text needs period! Last char is: '{text.strip()[-1]}'"
+    if stage == "add period":
+        return f"    DEBUG: Adding period. Text before: '{text}' | Text after: '{record['after']}'"
+    return f"    DEBUG ({stage}): '{text}'"
@@ -0,0 +1,318 @@
+import asyncio
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from batch_refine import init_worker, refine_requests
+
+MAX_BODY = 16 << 20
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           408: "Request Timeout", 413: "Payload Too Large", 500: "Internal Server Error",
+           503: "Service Unavailable", 504: "Gateway Timeout"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class ServiceNotRunning(RuntimeError):
+    """The service was not started, or closed before the request ran."""
+
+
+class RefinementService:
+    """
+    Asyncio front end for a refinement process pool.
+    Requests wait in a bounded queue; a dispatcher groups up to
+    ``batch_size`` of them (waiting at most ``batch_delay`` seconds to
+    fill a batch) into one pool task. At most two batches per worker are
+    in flight, so a busy pool lets the queue fill, and a full queue turns
+    new requests away instead of buffering without limit.
+    """
+    def __init__(self, workers=1, batch_size=16, batch_delay=0.005, queue_size=256,
+                 timeout=30.0, cache_entries=0, executor=None):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.cache_entries = cache_entries
+        self.executor = executor
+        self._own_executor = executor is None
+        self._queue = None
+        self._slots = None
+        self._dispatcher = None
+        self._batches = set()
+        self.stats = {'accepted': 0, 'completed': 0, 'rejected': 0,
+                      'timeouts': 0, 'failed': 0, 'batches': 0, 'batched_requests': 0}
+
+    async def start(self):
+        if self.executor is None:
+            # Spawned, not forked: forked workers would inherit open client
+            # sockets and hold those connections open after we close them
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.workers, initializer=init_worker,
+                initargs=(self.cache_entries,),
+                mp_context=multiprocessing.get_context("spawn"))
+        self._queue = asyncio.Queue(self.queue_size)
+        self._slots = asyncio.Semaphore(max(1, self.workers) * 2)
+        self._dispatcher = asyncio.ensure_future(self._dispatch())
+
+    async def close(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+        if self._queue is not None:
+            # Requests still queued would otherwise wait out their timeout
+            while not self._queue.empty():
+                _fail([self._queue.get_nowait()], ServiceNotRunning("RefinementService closed"))
+            self._queue = None
+        if self._batches:
+            await asyncio.gather(*self._batches, return_exceptions=True)
+        if self._own_executor and self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    async def refine(self, text, fused=False, timeout=None):
+        """
+        Refine one document; returns (refined_text, metrics).
+        Raises asyncio.QueueFull when the queue is full,
+        asyncio.TimeoutError after ``timeout`` (default: the service's) and
+        ServiceNotRunning (a RuntimeError) if the service is not started or
+        closes first.
+        """
+        if self._queue is None:
+            raise ServiceNotRunning("RefinementService is not running; await start() first")
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((text, fused, future))
+        except asyncio.QueueFull:
+            self.stats['rejected'] += 1
+            raise
+        self.stats['accepted'] += 1
+
+        try:
+            # A timed-out request is cancelled; the dispatcher skips it
+            return await asyncio.wait_for(future, timeout or self.timeout)
+        except asyncio.TimeoutError:
+            self.stats['timeouts'] += 1
+            raise
+
+    def snapshot(self):
+        """Service counters plus the current queue depth."""
+        stats = dict(self.stats)
+        stats['queued'] = self._queue.qsize() if self._queue is not None else 0
+        stats['in_flight_batches'] = len(self._batches)
+        return stats
+
+    # ---- Batching ----
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Wait for pool capacity first so requests pile up into batches
+            await self._slots.acquire()
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_delay
+            try:
+                while len(batch) < self.batch_size:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                    except asyncio.TimeoutError:
+                        break
+            except asyncio.CancelledError:
+                _fail(batch, ServiceNotRunning("RefinementService closed"))
+                raise
+
+            task = asyncio.ensure_future(self._run_batch(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _run_batch(self, batch):
+        try:
+            live = [(text, fused, future) for text, fused, future in batch if not future.done()]
+            if not live:
+                return
+            self.stats['batches'] += 1
+            self.stats['batched_requests'] += len(live)
+            loop = asyncio.get_running_loop()
+            try:
+                results = await loop.run_in_executor(
+                    self.executor, refine_requests, [(text, fused) for text, fused, _ in live])
+            except Exception as e:
+                self.stats['failed'] += len(live)
+                for _, _, future in live:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            for (_, _, future), result in zip(live, results):
+                if not future.done():
+                    future.set_result(result)
+                    self.stats['completed'] += 1
+        finally:
+            self._slots.release()
+
+    # ---- HTTP ----
+
+    async def handle_http(self, reader, writer):
+        """
+        Minimal HTTP/1.1 handler with keep-alive.
+          POST /refine  {"text": "...", "fused": false}  -> {"text", "metrics"}
+          GET  /stats   -> service counters
+        """
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(_read_request(reader), self.timeout)
+                except asyncio.TimeoutError:
+                    break
+                except HTTPError as e:
+                    await _respond(writer, e.status, {"error": str(e)}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+                status, payload = await self._route(method, path, body)
+                await _respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, method, path, body):
+        if path == "/stats":
+            if method != "GET":
+                return 405, {"error": "use GET"}
+            return 200, self.snapshot()
+        if path != "/refine":
+            return 404, {"error": f"no route {path}"}
+        if method != "POST":
+            return 405, {"error": "use POST"}
+
+        try:
+            request = json.loads(body)
+        except ValueError as e:
+            return 400, {"error": f"invalid JSON: {e}"}
+        if not isinstance(request, dict) or not isinstance(request.get("text"), str):
+            return 400, {"error": "expected {\"text\": \"...\"}"}
+        timeout = request.get("timeout")
+        if timeout is not None and (not isinstance(timeout, (int, float)) or timeout <= 0):
+            return 400, {"error": "timeout must be a positive number of seconds"}
+
+        try:
+            text, metrics = await self.refine(request["text"], bool(request.get("fused")),
+                                              timeout)
+        except asyncio.QueueFull:
+            return 503, {"error": "queue full, retry later"}
+        except ServiceNotRunning:
+            return 503, {"error": "service shutting down"}
+        except asyncio.TimeoutError:
+            return 504, {"error": "refinement timed out"}
+        except Exception as e:
+            return 500, {"error": f"refinement failed: {e}"}
+        return 200, {"text": text, "metrics": metrics}
+
+    async def serve(self, host="127.0.0.1", port=8765, path=None):
+        """Start the pool and listen on TCP, or on a unix socket at ``path``."""
+        await self.start()
+        if path is not None:
+            return await asyncio.start_unix_server(self.handle_http, path=path)
+        return await asyncio.start_server(self.handle_http, host, port)
+
+
+def _fail(entries, error):
+    """Fail the futures of queued (text, fused, future) requests."""
+    for _, _, future in entries:
+        if not future.done():
+            future.set_exception(error)
+
+
+async def _read_request(reader):
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, path, _ = line.decode("latin-1").split(None, 2)
+    except ValueError:
+        raise HTTPError(400, "malformed request line")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise HTTPError(400, "bad Content-Length")
+    if length < 0:
+        raise HTTPError(400, "bad Content-Length")
+    if length > MAX_BODY:
+        raise HTTPError(413, f"body over {MAX_BODY} bytes")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), path.split("?", 1)[0], headers, body
+
+
+async def _respond(writer, status, payload, keep_alive=True):
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    head = (
+        f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+        "Content-Type: application/json; charset=utf-8\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+    )
+    if status == 503:
+        head += "Retry-After: 1\r\n"
+    writer.write(head.encode("latin-1") + b"\r\n" + body)
+    await writer.drain()
+
+
+async def main(args):
+    service = RefinementService(workers=args.workers, batch_size=args.batch_size,
+                                batch_delay=args.batch_delay / 1000, queue_size=args.queue_size,
+                                timeout=args.timeout, cache_entries=args.cache_entries)
+    server = await service.serve(args.host, args.port, args.unix)
+    where = args.unix or f"http://{args.host}:{args.port}"
+    print(f"Refinement service on {where} ({args.workers} workers)")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Asyncio HTTP refinement service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", metavar="PATH", help="listen on a unix socket instead of TCP")
+    parser.add_argument("--workers", type=int, default=1, help="refinement processes")
+    parser.add_argument("--batch-size", type=int, default=16, help="max requests per pool task")
+    parser.add_argument("--batch-delay", type=float, default=5,
+                        help="ms to wait for a batch to fill (default: 5)")
+    parser.add_argument("--queue-size", type=int, default=256,
+                        help="queued requests before answering 503")
+    parser.add_argument("--timeout", type=float, default=30, help="seconds per request")
+    parser.add_argument("--cache-entries", type=int, default=0,
+                        help="per-worker zone cache size (default: 0, off)")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(main(args))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,351 @@
+import http.client
+import json
+import os
+import queue
+import re
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+from time import perf_counter
+from urllib.parse import urlsplit
+from refinement_engine import refine_batch
+from zone_node import count_tokens
+
+REFINE_PATH = "/v1/refine"
+# The stub's tokenizer: words and punctuation marks apart, roughly how a
+# subword tokenizer splits English prose
+STUB_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+class BackendError(Exception):
+    pass
+
+
+def make_backend(spec=None, **options):
+    """
+    "regex" (or None) for the built-in refiners; an ``http://host:port``
+    or ``unix:/path/to.sock`` URL for a server speaking the HTTPBackend
+    protocol.
+    """
+    if spec is None or spec == "regex":
+        return RegexBackend(**options)
+    return HTTPBackend(spec, **options)
+
+
+# ---- Backends ----
+# A backend refines batches of (text, zone_type, open_edges) zones to
+# completion. map() returns, in order, one (results, rule_stats_state,
+# usage) triple per batch: the per-zone result tuples of the process pool
+# (refinement_engine.refine_batch), and the input/output tokens the
+# backend reports (None when it reports none).
+
+class RegexBackend:
+    """The built-in rule refiners, run in this process."""
+    name = "regex"
+    cache_tag = None  # same results as refining without a backend
+
+    def __init__(self, batch_size=64):
+        self.batch_size = batch_size
+        self.requests = 0
+        self.zones = 0
+
+    def refine_batch(self, batch, fused=False, record_actions=False):
+        self.requests += 1
+        self.zones += len(batch)
+        results, rules = refine_batch(batch, fused, record_actions)
+        return results, rules, None
+
+    def map(self, batches, fused=False, record_actions=False):
+        return [self.refine_batch(batch, fused, record_actions) for batch in batches]
+
+    def stats(self):
+        return {'name': self.name, 'requests': self.requests, 'zones': self.zones}
+
+    def close(self):
+        pass
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout):
+        super().__init__("localhost", timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.unix_path)
+        self.sock = sock
+
+
+class HTTPBackend:
+    """
+    Refiner behind a server, e.g. a model server, at ``http://host:port``
+    or ``unix:/path/to.sock``. Each batch of zones is one POST of
+      {"zones": [{"text", "type", "open_edges"}, ...]}
+    answered with
+      {"results": [{"text"}, ...], "usage": {"input_tokens", "output_tokens"}}
+    The server only returns refined text; each zone is then counted here
+    as one pass (and one change if its text changed) over its words,
+    without rule counters.
+    At most ``max_in_flight`` requests run at once, each on a keep-alive
+    connection taken from a pool, so a run reuses a few connections.
+    """
+    name = "http"
+
+    def __init__(self, url, batch_size=16, max_in_flight=4, timeout=60.0):
+        parts = urlsplit(url)
+        if parts.scheme == "unix":
+            self._unix_path = parts.path
+            self._path = REFINE_PATH
+        elif parts.scheme == "http":
+            self._unix_path = None
+            self._path = parts.path if parts.path not in ("", "/") else REFINE_PATH
+        else:
+            raise ValueError(f"Unsupported backend URL: {url}")
+        self.url = url
+        self.cache_tag = url
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self._parts = parts
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._threads = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.counters = {'requests': 0, 'zones': 0, 'input_tokens': 0, 'output_tokens': 0,
+                         'connections': 0, 'reconnects': 0, 'peak_in_flight': 0}
+
+    def map(self, batches, fused=False, record_actions=False):
+        if len(batches) == 1 or self.max_in_flight == 1:
+            return [self.refine_batch(batch, fused, record_actions) for batch in batches]
+        if self._threads is None:
+            self._threads = ThreadPoolExecutor(max_workers=self.max_in_flight)
+        return list(self._threads.map(
+            lambda batch: self.refine_batch(batch, fused, record_actions), batches))
+
+    def refine_batch(self, batch, fused=False, record_actions=False):
+        body = json.dumps({
+            'zones': [{'text': text, 'type': zone_type, 'open_edges': list(open_edges)}
+                      for text, zone_type, open_edges in batch],
+        }, ensure_ascii=False).encode("utf-8", "surrogatepass")
+        started = perf_counter()
+
+        with self._slots:
+            with self._lock:
+                self._in_flight += 1
+                self.counters['peak_in_flight'] = max(self.counters['peak_in_flight'],
+                                                      self._in_flight)
+            try:
+                reply = self._post(body)
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+
+        try:
+            refined = [result['text'] for result in reply['results']]
+        except (KeyError, TypeError):
+            raise BackendError(f"{self.url}: malformed results")
+        if len(refined) != len(batch):
+            raise BackendError(f"{self.url}: {len(refined)} results for {len(batch)} zones")
+        wall = (perf_counter() - started) / len(batch)
+
+        # The engine's accounting for zones refined in one remote pass
+        results = []
+        for (text, _, _), new_text in zip(batch, refined):
+            changed = new_text != text
+            actions = [("remote", changed, new_text)] if record_actions else []
+            results.append((new_text, 1, int(changed), count_tokens(text), True, 1,
+                            actions, wall, 0.0, None))
+
+        reported = reply.get('usage') or {}
+        usage = {'input_tokens': reported.get('input_tokens', 0),
+                 'output_tokens': reported.get('output_tokens', 0)}
+        with self._lock:
+            self.counters['requests'] += 1
+            self.counters['zones'] += len(batch)
+            self.counters['input_tokens'] += usage['input_tokens']
+            self.counters['output_tokens'] += usage['output_tokens']
+        return results, ({}, {}), usage
+
+    def _post(self, body):
+        while True:
+            conn, reused = self._connection()
+            try:
+                conn.request("POST", self._path, body, {"Content-Type": "application/json"})
+                response = conn.getresponse()
+                data = response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                if not reused:
+                    raise
+                # The server closed an idle pooled connection; try a fresh one
+                with self._lock:
+                    self.counters['reconnects'] += 1
+                continue
+            except BaseException:
+                conn.close()
+                raise
+
+            if response.will_close:
+                conn.close()
+            else:
+                self._idle.put(conn)
+            if response.status != 200:
+                raise BackendError(f"{self.url}: HTTP {response.status} {data[:200]!r}")
+            return json.loads(data.decode("utf-8", "surrogatepass"))
+
+    def _connection(self):
+        try:
+            return self._idle.get_nowait(), True
+        except queue.Empty:
+            pass
+        if self._unix_path is not None:
+            conn = _UnixHTTPConnection(self._unix_path, self.timeout)
+        else:
+            conn = http.client.HTTPConnection(self._parts.hostname, self._parts.port,
+                                              timeout=self.timeout)
+        with self._lock:
+            self.counters['connections'] += 1
+        return conn, False
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        stats['name'] = self.name
+        stats['url'] = self.url
+        return stats
+
+    def close(self):
+        if self._threads is not None:
+            self._threads.shutdown()
+            self._threads = None
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+# ---- Local stub server ----
+
+def _stub_tokens(text):
+    return sum(1 for _ in STUB_TOKEN_RE.finditer(text))
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, as a model server would
+
+    def do_POST(self):
+        if self.path != REFINE_PATH:
+            self.send_error(404)
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length).decode("utf-8", "surrogatepass"))
+            batch = [(zone['text'], zone.get('type', "body"), tuple(zone.get('open_edges', ())))
+                     for zone in request['zones']]
+        except (ValueError, KeyError, TypeError, AttributeError):
+            self.send_error(400)
+            return
+
+        results, _ = refine_batch(batch, False, False)
+        replies = []
+        usage = {'input_tokens': 0, 'output_tokens': 0}
+        for (text, _, _), result in zip(batch, results):
+            replies.append({'text': result[0]})
+            usage['input_tokens'] += _stub_tokens(text)
+            usage['output_tokens'] += _stub_tokens(result[0])
+        self.server.requests += 1
+
+        body = json.dumps({'results': replies, 'usage': usage},
+                          ensure_ascii=False).encode("utf-8", "surrogatepass")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _TCPStubHandler(_StubHandler):
+    # Headers and body go out in separate writes; without this, Nagle's
+    # algorithm holds the body until the client's delayed ACK (~40ms)
+    disable_nagle_algorithm = True
+
+
+class _ThreadingUnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+
+class StubModelServer:
+    """
+    Local stand-in for a model server, for tests and demos. Serves the
+    HTTPBackend protocol over TCP (``port``, 0 picks a free one) or a
+    unix socket (``unix_path``) from a background thread, refining with
+    the regex refiners and reporting usage in its own tokens (words and
+    punctuation marks, like a subword tokenizer).
+    """
+    def __init__(self, host="127.0.0.1", port=0, unix_path=None):
+        if unix_path is not None:
+            self._server = _ThreadingUnixHTTPServer(unix_path, _StubHandler)
+            self.url = f"unix:{unix_path}"
+        else:
+            self._server = ThreadingHTTPServer((host, port), _TCPStubHandler)
+            self._server.daemon_threads = True
+            self.url = f"http://{host}:{self._server.server_address[1]}"
+        self._server.requests = 0
+        self._unix_path = unix_path
+        self._thread = None
+
+    @property
+    def requests(self):
+        return self._server.requests
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.url
+
+    def serve_forever(self):
+        """Serve from the calling thread until interrupted."""
+        try:
+            self._server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+        if self._unix_path is not None and os.path.exists(self._unix_path):
+            os.unlink(self._unix_path)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Local stub of a refinement model server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", metavar="PATH", help="listen on a unix socket instead")
+    args = parser.parse_args()
+
+    server = StubModelServer(args.host, args.port, args.unix)
+    print(f"Serving {server.url}{REFINE_PATH}")
+    server.serve_forever()
@@ -1,66 +1,491 @@
 import re
+import threading
+from bisect import bisect_right
+from functools import partial
+from time import perf_counter
+from refinement_events import wants
 
-def predict_zone_action(zone):
+
+class Rule:
     """
-    Predict what refinement is needed for this zone.
-    Designed to handle common everyday writing patterns.
+    A single predictor rule.
+    Regex rules carry a precompiled pattern; the rest use a cheap text check.
+    Only the first match of a regex rule is considered, and an optional
+    guard decides whether that match fires. An ``edge`` rule ("start" or
+    "end") is about a sentence boundary and is skipped for zones whose
+    text is cut mid-sentence at that edge.
+    ``reenables`` names the checks (rules, or "polish") that the rule's
+    action can make fire again on text where they passed.
     """
-    text = zone.text
-    print(f"    [PREDICT DEBUG] Checking zone: '{text[:50]}...' | Last 5 chars: '{text[-5:]}' | Stripped last char: '{text.strip()[-1] if text.strip() else 'EMPTY'}'")
+    def __init__(self, name, action, pattern=None, ignore_case=False,
+                 check=None, guard=None, zone_types=None, edge=None, reenables=()):
+        self.name = name
+        self.action = action
+        self.reenables = reenables
+        self.bit = 0  # set from the rule's place in RULES
+        self.stat_key = "predict:" + name
+        self.check = check
+        self.guard = guard
+        self.zone_types = zone_types  # None = every zone type
+        self.edge = edge
+        self.ignore_case = ignore_case
+        self.regex = None
+        self.folded_regex = None
+        if pattern:
+            flags = re.IGNORECASE if ignore_case else 0
+            self.regex = re.compile(pattern, flags)
+            # Case-sensitive twin for lowercased ASCII text, which keeps
+            # sre's literal fast paths that IGNORECASE turns off
+            self.folded_regex = re.compile(pattern) if ignore_case else self.regex
 
-    # PHASE 0: End punctuation check - DO THIS FIRST!
+    def applies_to(self, zone_type):
+        return self.zone_types is None or zone_type in self.zone_types
+
+    def fires(self, text, folded=None):
+        """
+        Check the rule against ``text``. ``folded`` is text.lower() for
+        ASCII text (or None) and is used by case-insensitive rules.
+        """
+        if self.regex is None:
+            return self.check(text)
+        if self.ignore_case and folded is not None:
+            text = folded
+            match = self.folded_regex.search(text)
+        else:
+            match = self.regex.search(text)
+        if match is None:
+            return False
+        return self.guard is None or self.guard(text, match)
+
+
+class RuleStats:
+    """
+    Per-rule counters: how often each rule was evaluated, how often it
+    fired (changed the text, for actions and polish steps) and the
+    seconds spent in it. Keys are "predict:<rule>", "apply:<action>"
+    and "polish:<step>".
+    Also counts the calls, characters and tokens each refiner stage
+    (predict, apply, polish) was handed.
+    A run records into its own RuleStats; merge() and the reports lock,
+    so runs on several threads can share one (e.g. PROCESS_RULE_STATS).
+    """
+    def __init__(self):
+        self.counters = {}
+        self.scanned = {}
+        self._lock = threading.Lock()
+
+    def scan(self, stage, chars, tokens, calls=1):
+        counter = self.scanned.get(stage)
+        if counter is None:
+            counter = self.scanned[stage] = [0, 0, 0]
+        counter[0] += calls
+        counter[1] += chars
+        counter[2] += tokens
+
+    def record(self, key, fired, seconds, evaluated=1):
+        counter = self.counters.get(key)
+        if counter is None:
+            counter = self.counters[key] = [0, 0, 0.0]
+        counter[0] += evaluated
+        counter[1] += fired
+        counter[2] += seconds
+
+    def merge(self, other):
+        """Add another RuleStats (or its state()) into this one."""
+        if isinstance(other, RuleStats):
+            other = other.state()
+        counters, scanned = other
+        with self._lock:
+            _add_counters(self.counters, counters)
+            _add_counters(self.scanned, scanned)
+
+    def state(self):
+        """Plain (counters, scanned) dicts, e.g. to send back from a worker."""
+        return self.counters, self.scanned
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                key: {'evaluated': evaluated, 'fired': fired, 'seconds': seconds}
+                for key, (evaluated, fired, seconds) in sorted(self.counters.items())
+            }
+
+    def scanned_dict(self):
+        with self._lock:
+            return {
+                stage: {'calls': calls, 'chars': chars, 'tokens': tokens}
+                for stage, (calls, chars, tokens) in self.scanned.items()
+            }
+
+
+def _add_counters(into, counters):
+    for key, values in counters.items():
+        counter = into.get(key)
+        if counter is None:
+            into[key] = list(values)
+        else:
+            for i, value in enumerate(values):
+                counter[i] += value
+
+
+# Everything refined in this process, merged in after each run
+PROCESS_RULE_STATS = RuleStats()
+
+
+def _needs_period(text):
     clean_text = text.strip()
-    if clean_text and clean_text[-1] not in '.!?':
-        print(f"    [PERIOD DEBUG] Text needs period! Last char is: '{clean_text[-1]}'")
-        return "add period"
+    return bool(clean_text) and clean_text[-1] not in '.!?'
 
-    # PHASE 1: Basic cleanup
-    if "  " in text:
-        return "fix spacing"
 
-    # PHASE 2: Contractions (do early)
-    if re.search(r'\b(im|dont|didnt|cant|wont|isnt|arent|wasnt|werent|havent|hasnt|wouldnt|couldnt|shouldnt)\b', text, re.IGNORECASE):
-        return "fix contractions"
+def _starts_lowercase(text):
+    return bool(text) and text[0].islower()
 
-    # PHASE 3: First letter capitalization (HIGH PRIORITY for run-on text)
-    if text and text[0].islower():
-        return "capitalize first"
 
-    # PHASE 4: Name capitalization (intro zones only)
-    if zone.zone_type == "intro":
-        if re.search(r'(name is|i am|i\'m|called)\s+([a-z]\w+)', text, re.IGNORECASE):
-            return "capitalize name"
+def _compound_guard(text, match):
+    before = text[:match.start(1)]
+    # Check no recent comma
+    if ',' in before[-10:] or '.' in before[-10:]:
+        return False
+    return len(before.split()) >= 3
+
+
+# Bump whenever a rule, action or polish step changes its output:
+# refinement caches key their entries on it.
+RULESET_VERSION = 1
+
+CONTRACTIONS = {
+    'im': "I'm",
+    'dont': "don't",
+    'didnt': "didn't",
+    'cant': "can't",
+    'wont': "won't",
+    'isnt': "isn't",
+    'arent': "aren't",
+    'wasnt': "wasn't",
+    'werent': "weren't",
+    'havent': "haven't",
+    'hasnt': "hasn't",
+    'wouldnt': "wouldn't",
+    'couldnt': "couldn't",
+    'shouldnt': "shouldn't"
+}
+NAME_RE = re.compile(r"(name is|i am|i\'m|called)\s+([a-z]\w+)", re.IGNORECASE)
+CONTRACTION_RE = re.compile(r'\b(' + '|'.join(CONTRACTIONS) + r')\b', re.IGNORECASE)
+CAPITALIZE_AFTER_RE = re.compile(r'([.!?]\s+)([a-z])')
+COMPOUND_APPLY_RE = re.compile(r'(\w{4,})(\s+)(but|and|or|so|yet)(\s+)', re.IGNORECASE)
 
+# polish_zone patterns
+SPACE_BEFORE_PUNCT_RE = re.compile(r'\s+([,.!?;:])')
+MISSING_SPACE_AFTER_PUNCT_RE = re.compile(r'([,.!?;:])([A-Za-z])')
+STANDALONE_I_RE = re.compile(r'\bi\b')
+REPEATED_PERIOD_RE = re.compile(r'\.\.+')
+REPEATED_COMMA_RE = re.compile(r',,+')
+SIMPLE_LIST_RE = re.compile(r'\blike\s+([a-z]+)\s+([a-z]+)\s+and\s+([a-z]+)', re.IGNORECASE)
+
+
+def _collapse_spaces(text):
+    return " ".join(text.split())
+
+
+# Predictor rules, highest priority first.
+# reenables: the checks an edit can turn from passing to firing. Stripping
+# leading whitespace exposes the first letter; moving or collapsing
+# whitespace and commas shifts the compound-comma match and its guard
+# window, and can join "name  is" or ". x"; case changes alone are
+# invisible to the case-insensitive rules.
+RULES = [
+    # PHASE 0: End punctuation check - DO THIS FIRST!
+    Rule("end_punctuation", "add period", check=_needs_period, edge="end",
+         reenables=("first_letter",)),
+    # PHASE 1: Basic cleanup
+    Rule("spacing", "fix spacing", r'  ',
+         reenables=("first_letter", "name", "compound_comma", "capitalize_after", "polish")),
+    # PHASE 2: Contractions (do early)
+    Rule("contractions", "fix contractions", CONTRACTION_RE.pattern, ignore_case=True,
+         reenables=("first_letter", "name", "compound_comma", "capitalize_after", "polish")),
+    # PHASE 3: First letter capitalization (HIGH PRIORITY for run-on text)
+    Rule("first_letter", "capitalize first", check=_starts_lowercase, edge="start"),
+    # PHASE 4: Name capitalization (intro zones only)
+    Rule("name", "capitalize name", NAME_RE.pattern, ignore_case=True,
+         zone_types=("intro",), reenables=("compound_comma",)),
     # PHASE 5: Compound sentence commas (BEFORE sentence breaks)
-    # "shopping but the" or "closed so i" need commas
-    if re.search(r'\s+(but|so|yet)\s+', text, re.IGNORECASE):
-        match = re.search(r'(\w+)(\s+)(but|so|yet)(\s+)', text, re.IGNORECASE)
-        if match:
-            before = text[:match.start(3)]
-            # Check no recent comma
-            if ',' not in before[-10:] and '.' not in before[-10:]:
-                words = before.split()
-                if len(words) >= 3:
-                    return "add compound comma"
-    
+    # "shopping but the" or "closed so i" need commas. Anchoring on the
+    # whitespace after a word finds the same first "word but " as
+    # (\w+)(\s+)(but|so|yet)(\s+) without retrying every word start.
+    Rule("compound_comma", "add compound comma",
+         r'(?<=\w)\s+(but|so|yet)\s', ignore_case=True, guard=_compound_guard,
+         reenables=("compound_comma",)),
     # PHASE 7: Capitalization fixes
-    if re.search(r'[.!?]\s+[a-z]', text):
-        return "capitalize after period"
+    Rule("capitalize_after", "capitalize after period", r'[.!?]\s+[a-z]'),
+]
+
+# ---- Check bits ----
+# zone.rule_mask holds a bit per rule known not to fire on the zone's
+# current text, plus POLISH_CLEAN once polish_zone found nothing to do.
+# Setting zone.text clears it; edit_zone_text keeps the bits the edit
+# cannot have invalidated.
+
+for _index, _rule in enumerate(RULES):
+    _rule.bit = 1 << _index
+CHECK_BITS = {rule.name: rule.bit for rule in RULES}
+CHECK_BITS["polish"] = POLISH_CLEAN = 1 << len(RULES)
+ALL_CHECKS = (POLISH_CLEAN << 1) - 1
+
+
+def _check_mask(names):
+    mask = POLISH_CLEAN  # any edit leaves polish to be rechecked
+    for name in names:
+        mask |= CHECK_BITS[name]
+    return mask
+
+
+# Actions without an entry (e.g. "add sentence break") clear every bit
+ACTION_REENABLES = {rule.action: _check_mask(rule.reenables) for rule in RULES}
+
+
+def edit_zone_text(zone, text, reenables=ALL_CHECKS):
+    """Set zone.text, keeping the check bits outside ``reenables``."""
+    mask = zone.rule_mask & ~reenables
+    zone.text = text
+    zone.rule_mask = mask
+
+
+# polish_zone steps, in order: (stats key, text -> text, checks it reenables)
+POLISH_STEPS = (
+    # Clean up spacing around punctuation
+    ("polish:space_before_punct", partial(SPACE_BEFORE_PUNCT_RE.sub, r'\1'),
+     _check_mask(("compound_comma", "capitalize_after"))),
+    ("polish:space_after_punct", partial(MISSING_SPACE_AFTER_PUNCT_RE.sub, r'\1 \2'),
+     _check_mask(("compound_comma", "capitalize_after"))),
+    # Fix double spaces
+    ("polish:double_spaces", _collapse_spaces,
+     _check_mask(("first_letter", "name", "compound_comma", "capitalize_after"))),
+    # Capitalize standalone "I"
+    ("polish:standalone_i", partial(STANDALONE_I_RE.sub, 'I'), _check_mask(())),
+    # Fix double punctuation
+    ("polish:repeated_period", partial(REPEATED_PERIOD_RE.sub, '.'),
+     _check_mask(("compound_comma", "capitalize_after"))),
+    ("polish:repeated_comma", partial(REPEATED_COMMA_RE.sub, ','),
+     _check_mask(("compound_comma",))),
+    # Fix simple lists: "like a b and c" → "like a, b and c"
+    # (writes "like" in lowercase, so the capitalization checks can fire again)
+    ("polish:simple_list", partial(SIMPLE_LIST_RE.sub, r'like \1, \2 and \3'),
+     _check_mask(("first_letter", "compound_comma", "capitalize_after"))),
+)
 
-    # PHASE 8: End punctuation - CRITICAL CHECK
-    clean_text = text.strip()
-    if clean_text and clean_text[-1] not in '.!?':
-        print(f"    DEBUG: Text needs period. Last char is: '{clean_text[-1]}'")
-        return "add period"
 
-    # Zone is complete
-    return "no change"
+def _expand_contraction(match):
+    word = match.group(1)
+    replacement = CONTRACTIONS.get(word.casefold())
+    if replacement is None:
+        # Case-insensitive matching also accepts a few non-ASCII look-alikes
+        for key, value in CONTRACTIONS.items():
+            if re.fullmatch(key, word, re.IGNORECASE):
+                return value
+    return replacement
 
 
-def apply_zone_action(zone, action):
+def _first_firing_rule(text, zone_type, stats=None, open_edges=(), passed=0):
+    """
+    Return (the highest-priority rule that fires on ``text`` or None,
+    check bits of the rules known not to fire). Each rule is evaluated
+    at most once, in priority order; rules in ``passed`` are skipped.
+    """
+    folded = None
+    for rule in RULES:
+        if passed & rule.bit:
+            continue
+        if not rule.applies_to(zone_type) or (open_edges and rule.edge in open_edges):
+            passed |= rule.bit
+            continue
+        if rule.ignore_case and folded is None and text.isascii():
+            folded = text.lower()
+        if stats is None:
+            fired = rule.fires(text, folded)
+        else:
+            start = perf_counter()
+            fired = rule.fires(text, folded)
+            stats.record(rule.stat_key, fired, perf_counter() - start)
+        if fired:
+            return rule, passed
+        passed |= rule.bit
+    return None, passed
+
+
+def count_zone_issues(zone):
+    """
+    Number of rules that fire on the zone's text: how much work the
+    zone still needs, for ordering zones under a budget.
+    """
+    text = zone.text
+    folded = text.lower() if text.isascii() else None
+    issues = 0
+    for rule in RULES:
+        if zone.rule_mask & rule.bit or not rule.applies_to(zone.zone_type):
+            continue
+        if zone.open_edges and rule.edge in zone.open_edges:
+            continue
+        if rule.fires(text, folded):
+            issues += 1
+    return issues
+
+
+def predict_zone_action(zone, events=None, stats=None):
+    """
+    Predict what refinement is needed for this zone.
+    Designed to handle common everyday writing patterns.
+    """
+    text = zone.text
+    debug = wants(events, "debug")
+    if debug:
+        events.emit("debug", zone=zone.zone_id, stage="predict", text=text)
+
+    if stats is not None:
+        stats.scan("predict", len(text), zone.count_tokens())
+    rule, zone.rule_mask = _first_firing_rule(text, zone.zone_type, stats,
+                                              zone.open_edges, zone.rule_mask)
+    if rule is None:
+        # Zone is complete
+        return "no change"
+
+    if debug and rule.action == "add period":
+        events.emit("debug", zone=zone.zone_id, stage="needs period", text=text)
+    return rule.action
+
+
+# ---- Batch prediction ----
+
+ZONE_SEPARATOR = "\0"  # no rule matches across it; zones containing it go one by one
+PREDICT_BATCH_CHARS = 1 << 20
+PREDICT_BATCH_MIN_ZONES = 32  # below this the per-zone path is faster
+
+
+def predict_zone_actions(zones, stats=None):
+    """
+    predict_zone_action for a list of zones at once (no debug events).
+    Zone texts are joined with ZONE_SEPARATOR, about PREDICT_BATCH_CHARS
+    at a time, and each regex rule sweeps the joined text: a match is
+    mapped back to its zone through the zone start offsets, and the
+    sweep jumps to the next zone, so only the first match in a zone is
+    seen, as with a per-zone search. Returns the actions in zone order
+    and updates rule_mask like the per-zone path.
+    """
+    if len(zones) < PREDICT_BATCH_MIN_ZONES:
+        return [predict_zone_action(zone, stats=stats) for zone in zones]
+    actions = []
+    batch = []
+    size = 0
+    for zone in zones:
+        batch.append(zone)
+        size += len(zone.text) + 1
+        if size >= PREDICT_BATCH_CHARS:
+            actions.extend(_predict_batch(batch, stats))
+            batch = []
+            size = 0
+    if batch:
+        actions.extend(_predict_batch(batch, stats))
+    return actions
+
+
+def _predict_batch(zones, stats):
+    texts = [zone.text for zone in zones]
+    if ZONE_SEPARATOR.join(texts).count(ZONE_SEPARATOR) != len(texts) - 1:
+        return [predict_zone_action(zone, stats=stats) for zone in zones]
+    if stats is not None:
+        stats.scan("predict", sum(map(len, texts)),
+                   sum(zone.count_tokens() for zone in zones), len(zones))
+
+    found = [None] * len(zones)
+    passed = [zone.rule_mask for zone in zones]
+    undecided = range(len(zones))
+    for rule in RULES:
+        start = perf_counter()
+        bit = rule.bit
+        if rule.zone_types is None and rule.edge is None:
+            evaluate = [i for i in undecided if not passed[i] & bit]
+        else:
+            evaluate = []
+            for i in undecided:
+                zone = zones[i]
+                if passed[i] & bit:
+                    continue
+                if not rule.applies_to(zone.zone_type) or (zone.open_edges and rule.edge in zone.open_edges):
+                    passed[i] |= bit
+                    continue
+                evaluate.append(i)
+        if not evaluate:
+            continue
+
+        if rule.regex is None:
+            fires = [rule.check(texts[i]) for i in evaluate]
+        else:
+            fires = _sweep(rule, [texts[i] for i in evaluate])
+
+        fired = 0
+        for i, hit in zip(evaluate, fires):
+            if hit:
+                found[i] = rule
+                fired += 1
+            else:
+                passed[i] |= bit
+        if stats is not None:
+            stats.record(rule.stat_key, fired, perf_counter() - start, len(evaluate))
+        if fired:
+            undecided = [i for i in undecided if found[i] is None]
+            if not undecided:
+                break
+
+    for zone, mask in zip(zones, passed):
+        zone.rule_mask = mask
+    return [rule.action if rule is not None else "no change" for rule in found]
+
+
+def _sweep(rule, texts):
+    """Whether ``rule`` fires on each of ``texts``, from one pass over them joined."""
+    joined = ZONE_SEPARATOR.join(texts)
+    regex = rule.regex
+    if rule.ignore_case and joined.isascii():
+        joined = joined.lower()
+        regex = rule.folded_regex
+    starts = []
+    offset = 0
+    for text in texts:
+        starts.append(offset)
+        offset += len(text) + 1
+
+    fires = [False] * len(texts)
+    last = len(texts) - 1
+    search = regex.search
+    match = search(joined)
+    while match is not None:
+        # Map the match back to its text, then skip to the next text
+        i = bisect_right(starts, match.start()) - 1
+        if rule.guard is None:
+            fires[i] = True
+        else:
+            # Guards look at the text around its first match
+            text = texts[i]
+            fires[i] = rule.fires(text, text.lower() if rule.ignore_case and text.isascii() else None)
+        if i == last:
+            break
+        match = search(joined, starts[i + 1])
+    return fires
+
+
+def apply_zone_action(zone, action, events=None, stats=None):
     """
     Apply refinement action to a specific zone.
     """
+    if stats is None:
+        return _apply_action(zone, action, events)
+    stats.scan("apply", len(zone.text), zone.count_tokens())
+    start = perf_counter()
+    changed = _apply_action(zone, action, events)
+    stats.record("apply:" + action, changed, perf_counter() - start)
+    return changed
+
+
+def _apply_action(zone, action, events):
     text = zone.text
     original = text
     
@@ -72,27 +497,10 @@ def apply_zone_action(zone, action):
             prefix = match.group(1)
             name = match.group(2)
             return f"{prefix} {name.capitalize()}"
-        text = re.sub(r'(name is|i am|i\'m|called)\s+([a-z]\w+)', cap_name, text, count=1, flags=re.IGNORECASE)
+        text = NAME_RE.sub(cap_name, text, count=1)
     
     elif action == "fix contractions":
-        contractions = {
-            r'\bim\b': "I'm",
-            r'\bdont\b': "don't",
-            r'\bdidnt\b': "didn't",
-            r'\bcant\b': "can't",
-            r'\bwont\b': "won't",
-            r'\bisnt\b': "isn't",
-            r'\barent\b': "aren't",
-            r'\bwasnt\b': "wasn't",
-            r'\bwerent\b': "weren't",
-            r'\bhavent\b': "haven't",
-            r'\bhasnt\b': "hasn't",
-            r'\bwouldnt\b': "wouldn't",
-            r'\bcouldnt\b': "couldn't",
-            r'\bshouldnt\b': "shouldn't"
-        }
-        for pattern, replacement in contractions.items():
-            text = re.sub(pattern, replacement, text, flags=re.IGNORECASE)
+        text = CONTRACTION_RE.sub(_expand_contraction, text)
     
     elif action == "add sentence break":
         # Find where to add the break - be smarter about placement
@@ -135,20 +543,22 @@ def apply_zone_action(zone, action):
     
     elif action == "add compound comma":
         # Add comma before conjunction
-        match = re.search(r'(\w{4,})(\s+)(but|and|or|so|yet)(\s+)', text, re.IGNORECASE)
+        match = COMPOUND_APPLY_RE.search(text)
         if match:
             before = text[:match.start(3)]
             if ',' not in before[-15:]:
                 text = text[:match.end(1)] + ',' + text[match.end(1):]
     
     elif action == "add period":
-        print(f"    DEBUG: Adding period. Text before: '{text}' | Text after: '{text.strip() + '.'}'")
+        if wants(events, "debug"):
+            events.emit("debug", zone=zone.zone_id, stage="add period",
+                        text=text, after=text.strip() + ".")
         text = text.strip() + "."
     
     elif action == "capitalize after period":
         def cap_after(match):
             return match.group(1) + match.group(2).upper()
-        text = re.sub(r'([.!?]\s+)([a-z])', cap_after, text)
+        text = CAPITALIZE_AFTER_RE.sub(cap_after, text)
     
     elif action == "capitalize first":
         # Only capitalize if it's truly the start or after punctuation
@@ -161,42 +571,78 @@ def apply_zone_action(zone, action):
     # Track changes
     if text != original:
         zone.mark_change()
+        edit_zone_text(zone, text, ACTION_REENABLES.get(action, ALL_CHECKS))
     
-    zone.text = text
     zone.tokens_processed += zone.count_tokens()
     return text != original
 
 
-def polish_zone(zone):
+def polish_zone(zone, stats=None):
     """
     Final polish pass for a zone.
+    Skipped while the zone is marked POLISH_CLEAN.
     """
+    if zone.rule_mask & POLISH_CLEAN:
+        return False
     text = zone.text
     original = text
-    
-    # Clean up spacing around punctuation
-    text = re.sub(r'\s+([,.!?;:])', r'\1', text)
-    text = re.sub(r'([,.!?;:])([A-Za-z])', r'\1 \2', text)
-    
-    # Fix double spaces
-    text = " ".join(text.split())
-    
-    # Capitalize standalone "I"
-    text = re.sub(r'\bi\b', 'I', text)
-    
-    # Fix double punctuation
-    text = re.sub(r'\.\.+', '.', text)
-    text = re.sub(r',,+', ',', text)
-    # Fix simple lists: "like a b and c" → "like a, b and c"
-    text = re.sub(
-        r'\blike\s+([a-z]+)\s+([a-z]+)\s+and\s+([a-z]+)',
-        r'like \1, \2 and \3',
-        text,
-        flags=re.IGNORECASE
-    )
-    
-    if text != original:
-        zone.mark_change()
-    
-    zone.text = text
-    return text != original
\ No newline at end of file
+    reenables = 0
+
+    if stats is None:
+        for _, step, checks in POLISH_STEPS:
+            polished = step(text)
+            if polished != text:
+                reenables |= checks
+                text = polished
+    else:
+        stats.scan("polish", len(text), zone.count_tokens())
+        for key, step, checks in POLISH_STEPS:
+            start = perf_counter()
+            polished = step(text)
+            fired = polished != text
+            stats.record(key, fired, perf_counter() - start)
+            if fired:
+                reenables |= checks
+                text = polished
+
+    if text == original:
+        zone.rule_mask |= POLISH_CLEAN
+        return False
+
+    zone.mark_change()
+    edit_zone_text(zone, text, reenables)
+    return True
+
+
+def refine_zone(zone, max_actions, events=None, stats=None):
+    """
+    Fused refinement pass for a zone.
+    Applies every fix that fires, in priority order, until the zone is
+    clean or ``max_actions`` actions were applied. The text matches what
+    one action per cycle would give after as many cycles.
+    Stops early, setting zone.stall, when an action leaves the text as it
+    was ("fixed point") or brings back an earlier text ("oscillation").
+    Returns (actions applied, whether the zone reached "no change").
+    """
+    actions = []
+    seen = {hash(zone.text)}
+    while len(actions) < max_actions:
+        action = predict_zone_action(zone, events, stats)
+        if action == "no change":
+            return actions, True
+        before = zone.text
+        changed = apply_zone_action(zone, action, events, stats)
+        changed = polish_zone(zone, stats) or changed
+        actions.append(action)
+        if wants(events, "action"):
+            events.emit("action", zone=zone.zone_id, action=action,
+                        changed=changed, text=zone.text)
+        if zone.text == before:
+            zone.stall = "fixed point"
+            break
+        text_hash = hash(zone.text)
+        if text_hash in seen:
+            zone.stall = "oscillation"
+            break
+        seen.add(text_hash)
+    return actions, False
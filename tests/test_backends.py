@@ -0,0 +1,50 @@
+import re
+
+from benchmark import make_corpus
+from main_showcase import run_refinement
+from refiner_backends import HTTPBackend, RegexBackend, StubModelServer
+
+DOCUMENT = make_corpus(20000, 5)
+TOKEN_KEYS = ('tokens_traditional', 'tokens_actual', 'efficiency_gain',
+              'tokens_processed', 'total_changes', 'total_passes')
+
+
+def _token_metrics(metrics):
+    return {key: metrics[key] for key in TOKEN_KEYS}
+
+
+def _stub_tokens(text):
+    return len(re.findall(r"\w+|[^\w\s]", text))
+
+
+def test_http_backend_matches_serial_run():
+    _, expected_text, expected = run_refinement(DOCUMENT)
+    with StubModelServer() as stub:
+        backend = HTTPBackend(stub.url)
+        try:
+            _, text, metrics = run_refinement(DOCUMENT, backend=backend)
+        finally:
+            backend.close()
+    assert text == expected_text
+    assert metrics['zones'] == expected['zones'] == metrics['backend']['zones']
+    # Word counts, one pass per zone; the server's own tokens kept apart
+    assert metrics['tokens_traditional'] == metrics['tokens_processed'] == len(DOCUMENT.split())
+    assert metrics['backend_input_tokens'] == _stub_tokens(DOCUMENT)
+    assert metrics['backend_output_tokens'] == _stub_tokens(text)
+
+
+def test_http_backend_defaults_to_refine_path():
+    with StubModelServer() as stub:
+        backend = HTTPBackend(stub.url + "/")
+        try:
+            text = run_refinement(DOCUMENT[:2000], backend=backend)[1]
+        finally:
+            backend.close()
+    assert text == run_refinement(DOCUMENT[:2000])[1]
+
+
+def test_token_metrics_do_not_depend_on_the_backend():
+    _, _, expected = run_refinement(DOCUMENT, fused=True)
+    _, _, metrics = run_refinement(DOCUMENT, fused=True, backend=RegexBackend())
+    assert _token_metrics(metrics) == _token_metrics(expected)
+    assert metrics['backend_input_tokens'] == metrics['backend_output_tokens'] == 0
@@ -0,0 +1,94 @@
+import random
+
+import pytest
+
+import smart_refiners
+from benchmark import make_corpus
+from smart_refiners import (ALL_CHECKS, PREDICT_BATCH_CHARS, RuleStats, predict_zone_action,
+                            predict_zone_actions)
+from zone_manager import iter_zones
+from zone_node import ZoneNode
+
+FRAGMENTS = ["i think", "Like apples pears and plums", "im here", "dont go", "ok", "so",
+             "the store was closed", "WAS", " .", "..", ",,", " ,", "!", "?", "\n",
+             "my name is bob", "hello", "HELLO THERE", "and", "but", "  ", "\0", "x\0y"]
+ZONE_TYPES = ("intro", "body", "conclusion")
+EDGES = ((), (), ("start",), ("end",), ("start", "end"))
+
+
+def targeted_zones(count, seed, separators=False):
+    rng = random.Random(seed)
+    zones = []
+    for zone_id in range(count):
+        fragments = [rng.choice(FRAGMENTS) for _ in range(rng.randint(0, 12))]
+        text = " ".join(fragment for fragment in fragments
+                        if separators or "\0" not in fragment)
+        zones.append(_zone(zone_id, text, rng))
+    return zones
+
+
+def corpus_zones(size, seed):
+    rng = random.Random(seed)
+    return [_zone(node.zone_id, node.text, rng)
+            for node in iter_zones(make_corpus(size, seed))]
+
+
+def _zone(zone_id, text, rng):
+    zone = ZoneNode(zone_id, text, rng.choice(ZONE_TYPES))
+    zone.open_edges = rng.choice(EDGES)
+    # Checks already known to pass, as after earlier visits
+    zone.rule_mask = rng.getrandbits(ALL_CHECKS.bit_length()) & ALL_CHECKS \
+        if rng.random() < 0.3 else 0
+    return zone
+
+
+def _copy(zones):
+    copies = []
+    for zone in zones:
+        copy = ZoneNode(zone.zone_id, zone.text, zone.zone_type)
+        copy.open_edges = zone.open_edges
+        copy.rule_mask = zone.rule_mask
+        copies.append(copy)
+    return copies
+
+
+def _counts(stats):
+    state = stats.as_dict()
+    return ({key: (value['evaluated'], value['fired']) for key, value in state.items()},
+            stats.scanned_dict())
+
+
+def assert_batch_matches_per_zone(zones):
+    single, batched = _copy(zones), _copy(zones)
+    single_stats, batch_stats = RuleStats(), RuleStats()
+    expected = [predict_zone_action(zone, stats=single_stats) for zone in single]
+    assert predict_zone_actions(batched, stats=batch_stats) == expected
+    assert [zone.rule_mask for zone in batched] == [zone.rule_mask for zone in single]
+    assert _counts(batch_stats) == _counts(single_stats)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_targeted_zones(seed):
+    assert_batch_matches_per_zone(targeted_zones(400, seed))
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_zones_with_separator(seed):
+    zones = targeted_zones(200, seed, separators=True)
+    assert any("\0" in zone.text for zone in zones)
+    assert_batch_matches_per_zone(zones)
+
+
+def test_fewer_zones_than_a_batch():
+    assert_batch_matches_per_zone(targeted_zones(smart_refiners.PREDICT_BATCH_MIN_ZONES - 1, 9))
+
+
+def test_batches_cut_at_the_size_limit(monkeypatch):
+    monkeypatch.setattr(smart_refiners, "PREDICT_BATCH_CHARS", 2000)
+    assert_batch_matches_per_zone(targeted_zones(600, 11) + corpus_zones(20000, 4))
+
+
+def test_batches_span_the_megabyte_cut():
+    zones = corpus_zones(PREDICT_BATCH_CHARS + (PREDICT_BATCH_CHARS >> 2), 12)
+    assert sum(len(zone.text) + 1 for zone in zones) > PREDICT_BATCH_CHARS
+    assert_batch_matches_per_zone(zones)
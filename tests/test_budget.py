@@ -0,0 +1,57 @@
+from benchmark import make_corpus
+from main_showcase import run_refinement
+from refinement_engine import Budget, refine_zones
+from zone_manager import ZoneManager
+
+DOCUMENT = make_corpus(20000, 1)
+
+
+def test_unlimited_budget_matches_normal_run():
+    _, text, metrics = run_refinement(DOCUMENT, deadline=60.0, token_budget=10 ** 9)
+    assert text == run_refinement(DOCUMENT)[1]
+    assert not metrics['budget']['exhausted']
+    assert metrics['budget']['unrefined_zones'] == []
+
+
+def test_token_budget_skips_zones_that_do_not_fit():
+    _, text, metrics = run_refinement(DOCUMENT, token_budget=50)
+    budget = metrics['budget']
+    assert 0 < budget['tokens_spent'] <= 50
+    assert metrics['total_changes'] > 0
+    assert budget['exhausted'] and not budget['timed_out']
+    assert budget['unrefined_zones']
+
+
+class TickingClock:
+    """Fake clock: every reading is ``tick`` seconds after the last."""
+    def __init__(self, tick):
+        self.now = 0.0
+        self.tick = tick
+
+    def __call__(self):
+        self.now += self.tick
+        return self.now
+
+
+def test_deadline_stops_scoring_and_visits():
+    manager = ZoneManager()
+    manager.split_into_zones(make_corpus(1 << 20, 1))
+    clock = TickingClock(0.001)
+    budget = Budget(seconds=0.05, clock=clock)
+    refine_zones(manager, budget=budget)
+    assert budget.timed_out and budget.exhausted
+    # Issue scoring and the visits both read the clock, so the run ends
+    # within a few readings of the 50 readings the deadline allows
+    assert clock.now < 0.1
+    assert budget.unrefined
+    assert sum(zone.refinement_passes for zone in manager.zones) < 50
+
+
+def test_deadline_bounds_refinement_time():
+    document = make_corpus(1 << 20, 1)
+    _, text, metrics = run_refinement(document, deadline=0.05)
+    assert metrics['budget']['timed_out']
+    # Generous: splitting the text is not covered by the deadline, and
+    # this only guards against scoring or refining the whole document
+    assert metrics['wall_seconds'] < 5
+    assert len(text) > 0
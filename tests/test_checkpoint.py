@@ -0,0 +1,87 @@
+import io
+
+import pytest
+
+from main_showcase import _file_digest, refine_checkpointed
+from refinement_engine import Checkpoint, refine_zones
+from refinement_events import RefinementEvents
+import zone_manager
+from zone_manager import ZoneManager
+
+TEXT = ("hello world. my name is bob and i dont like rain. it was closed so i went home. "
+        "we like apples pears and plums. this is a  test") * 20
+
+
+class Interrupted(Exception):
+    pass
+
+
+def _interrupt_after(visits):
+    events = RefinementEvents()
+    seen = []
+
+    def on_visit(record):
+        seen.append(record)
+        if len(seen) == visits:
+            raise Interrupted
+
+    events.subscribe(on_visit, ["visit"])
+    return events
+
+
+def _refined(text, fused=False):
+    manager = ZoneManager()
+    manager.split_into_zones(text)
+    refine_zones(manager, fused=fused)
+    return manager.get_combined_text()
+
+
+@pytest.mark.parametrize("fused", [False, True])
+def test_resume_after_interruption_matches_full_run(tmp_path, fused):
+    source = tmp_path / "input.txt"
+    source.write_text(TEXT, encoding="utf-8")
+    snapshot = str(tmp_path / "run.ckpt")
+
+    manager = ZoneManager()
+    manager.split_into_zones(TEXT)
+    checkpoint = Checkpoint(snapshot, interval=0, source={
+        'input': _file_digest(str(source)),
+        'fused': fused, 'zone_tokens': None})
+    with pytest.raises(Interrupted):
+        refine_zones(manager, fused=fused, events=_interrupt_after(25), checkpoint=checkpoint)
+
+    out = io.StringIO()
+    refine_checkpointed(str(source), out, snapshot, interval=0, fused=fused)
+    assert out.getvalue() == _refined(TEXT, fused)
+    assert not (tmp_path / "run.ckpt").exists()
+
+
+def test_snapshot_of_another_input_is_rejected(tmp_path):
+    first = tmp_path / "a.txt"
+    second = tmp_path / "b.txt"
+    first.write_text("hello world. this is a  test", encoding="utf-8")
+    second.write_text("another doc here. bye", encoding="utf-8")
+    snapshot = str(tmp_path / "run.ckpt")
+
+    manager = ZoneManager()
+    manager.split_into_zones(first.read_text(encoding="utf-8"))
+    refine_zones(manager, checkpoint=Checkpoint(snapshot, interval=0, source={
+        'input': _file_digest(str(first)),
+        'fused': False, 'zone_tokens': None}))
+
+    with pytest.raises(ValueError):
+        refine_checkpointed(str(second), io.StringIO(), snapshot)
+    with pytest.raises(ValueError):
+        refine_checkpointed(str(first), io.StringIO(), snapshot, fused=True)
+
+
+def test_checkpoint_of_another_ruleset_is_rejected(tmp_path, monkeypatch):
+    path = str(tmp_path / "run.ckpt")
+    manager = ZoneManager()
+    manager.split_into_zones(TEXT)
+    refine_zones(manager, checkpoint=Checkpoint(path, interval=0))
+    ZoneManager.read_checkpoint(path)
+
+    monkeypatch.setattr(zone_manager, "RULESET_VERSION", zone_manager.RULESET_VERSION + 1)
+    with pytest.raises(ValueError, match="ruleset"):
+        ZoneManager.read_checkpoint(path)
@@ -0,0 +1,28 @@
+from benchmark import make_corpus
+from main_showcase import run_refinement
+from refinement_events import RefinementEvents
+
+DOCUMENT = make_corpus(3000, 11)
+
+
+def test_runs_sharing_events_unsubscribe_their_logs():
+    events = RefinementEvents()
+    seen = []
+    events.subscribe(seen.append, ["refined"])
+    first = run_refinement(DOCUMENT, events=events)[0]
+    logged = len(first)
+    for _ in range(2):
+        logs = run_refinement(DOCUMENT, events=events)[0]
+        assert len(logs) == logged
+    assert len(first) == logged
+    assert not events.wants("action")
+    assert events._subscribers == {"refined": [seen.append]}
+    assert len(seen) == 3 * sum(1 for record in first if record["event"] == "refined")
+
+
+def test_unsubscribe_matches_bound_methods():
+    events = RefinementEvents()
+    logs = []
+    events.subscribe(logs.append, ["visit"])
+    events.unsubscribe(logs.append)
+    assert not events.wants("visit")
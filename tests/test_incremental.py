@@ -0,0 +1,79 @@
+import random
+
+import pytest
+from benchmark import make_corpus
+from main_showcase import run_refinement
+from refinement_cache import RefinementCache
+from refinement_engine import refine_zones
+from zone_manager import ZoneManager, iter_sentences
+
+DOCUMENT = make_corpus(20000, 3)
+STALL_KEYS = ('stalled_zones', 'fixed_points', 'oscillations', 'total_changes')
+
+
+def _refined_manager(text, zone_tokens=None):
+    manager = ZoneManager()
+    manager.split_into_zones(text, zone_tokens)
+    refine_zones(manager)
+    return manager
+
+
+def test_identical_resubmission_reuses_finished_zones():
+    manager = _refined_manager(DOCUMENT)
+    unfinished = [zone for zone in manager.zones
+                  if not zone.is_refined and zone.stall is None]
+    assert any(zone.stall for zone in manager.zones)
+    assert len(manager.update_text(DOCUMENT)) == len(unfinished)
+
+
+def test_cached_results_keep_stall_state(tmp_path):
+    expected = run_refinement(DOCUMENT)[2]
+    assert expected['stalled_zones']
+    for workers in (None, 2):
+        cache = RefinementCache(path=str(tmp_path / f"cache{workers}.db"))
+        try:
+            for _ in range(2):
+                metrics = run_refinement(DOCUMENT, cache=cache, workers=workers)[2]
+                assert {key: metrics[key] for key in STALL_KEYS} == \
+                    {key: expected[key] for key in STALL_KEYS}
+        finally:
+            cache.close()
+
+
+@pytest.mark.parametrize("zone_tokens", [None, 40])
+def test_inserted_sentences_only_regroup_their_neighbours(zone_tokens):
+    middle = DOCUMENT.index(". ", len(DOCUMENT) // 2) + 2
+    edited = "Hello there. " + DOCUMENT[:middle] + "One more line. " + DOCUMENT[middle:]
+    manager = _refined_manager(DOCUMENT, zone_tokens)
+    unfinished = sum(1 for zone in manager.zones
+                     if not zone.is_refined and zone.stall is None)
+
+    assert len(manager.update_text(edited)) <= unfinished + 12
+    refine_zones(manager)
+    _, text, metrics = run_refinement(edited, zone_tokens=zone_tokens)
+    assert manager.get_combined_text() == text
+    assert len(manager.zones) == metrics['zones']
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_edits_refine_like_a_fresh_run(seed):
+    rng = random.Random(seed)
+    sentences = list(iter_sentences(DOCUMENT))
+    others = list(iter_sentences(make_corpus(2000, seed + 100)))
+    zone_tokens = rng.choice([None, 25])
+    manager = _refined_manager(DOCUMENT, zone_tokens)
+    for _ in range(5):
+        at = rng.randrange(len(sentences))
+        edit = rng.choice(("insert", "delete", "replace"))
+        if edit == "insert":
+            sentences.insert(at, rng.choice(others))
+        elif edit == "delete":
+            del sentences[at]
+        else:
+            sentences[at] = rng.choice(others)
+        edited = " ".join(sentences)
+        expected = run_refinement(edited, zone_tokens=zone_tokens)
+        result = run_refinement(edited, manager=manager)
+        assert result[1] == expected[1]
+        assert {key: result[2][key] for key in STALL_KEYS} == \
+            {key: expected[2][key] for key in STALL_KEYS}
@@ -0,0 +1,28 @@
+import pytest
+
+from benchmark import make_corpus
+from main_showcase import run_refinement
+
+DOCUMENTS = [make_corpus(20000, 2), make_corpus(3000, 8), "just one zone here"]
+EVENTS = ("cycle", "visit", "action", "refined", "stalled", "cycle_end")
+TIMINGS = ('zone_wall_seconds', 'zone_cpu_seconds', 'wall_seconds', 'cpu_seconds',
+           'cycle_times')
+
+
+def _comparable(metrics):
+    result = {key: value for key, value in metrics.items() if key not in TIMINGS}
+    result['rules'] = {key: (value['evaluated'], value['fired'])
+                       for key, value in metrics['rules'].items()}
+    return result
+
+
+@pytest.mark.parametrize("fused", [False, True])
+def test_workers_match_serial_run(fused):
+    for document in DOCUMENTS:
+        logs, text, metrics = run_refinement(document, fused=fused)
+        parallel_logs, parallel_text, parallel_metrics = \
+            run_refinement(document, fused=fused, workers=2)
+        assert parallel_text == text
+        assert _comparable(parallel_metrics) == _comparable(metrics)
+        assert [record for record in parallel_logs if record["event"] in EVENTS] == \
+            [record for record in logs if record["event"] in EVENTS]
@@ -0,0 +1,51 @@
+import sqlite3
+
+from benchmark import make_corpus
+from main_showcase import run_refinement
+from refinement_cache import RefinementCache
+
+
+def test_bytes_used_tracks_entries_through_sqlite_evictions(tmp_path):
+    cache = RefinementCache(max_entries=50, path=str(tmp_path / "cache.db"))
+    try:
+        for seed in range(20):
+            # Non-ASCII text: sqlite caches each str's UTF-8 form as it binds it
+            document = make_corpus(3000, seed).replace("e", "é").replace("a", "â")
+            run_refinement(document, cache=cache)
+            stored = sum(len(key) + len(result[0].encode("utf-8"))
+                         for key, result in cache._entries.items())
+            assert cache.bytes_used == stored
+        assert cache.evictions > 0
+    finally:
+        cache.close()
+
+
+def _stored_rows(path):
+    # A second connection only sees committed rows
+    db = sqlite3.connect(path)
+    try:
+        return db.execute("SELECT COUNT(*) FROM refinements").fetchone()[0]
+    finally:
+        db.close()
+
+
+def test_runs_commit_their_entries(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = RefinementCache(path=path)
+    try:
+        metrics = run_refinement(make_corpus(3000, 1), cache=cache)[2]
+        assert _stored_rows(path) == metrics['cache']['misses'] > 0
+    finally:
+        cache.close()
+
+
+def test_entries_are_committed_in_batches(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = RefinementCache(path=path, commit_every=10)
+    try:
+        for i in range(25):
+            cache.put(RefinementCache.key(f"zone {i}.", "body"), (f"Zone {i}.", 1, 1, 2, True, None))
+        assert _stored_rows(path) == 20
+    finally:
+        cache.close()
+    assert _stored_rows(path) == 25
@@ -0,0 +1,136 @@
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from benchmark import make_corpus
+from main_showcase import run_refinement
+from refinement_service import RefinementService, ServiceNotRunning
+
+DOCUMENT = make_corpus(2000, 7)
+
+
+async def _post(port, payload):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = json.dumps(payload).encode("utf-8")
+    writer.write(b"POST /refine HTTP/1.1\r\nHost: test\r\nConnection: close\r\n"
+                 + f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(body)
+
+
+async def _serve(service):
+    server = await service.serve(port=0)
+    return server, server.sockets[0].getsockname()[1]
+
+
+def test_refine_over_http():
+    async def scenario():
+        service = RefinementService(workers=1)
+        server, port = await _serve(service)
+        try:
+            return await _post(port, {"text": DOCUMENT})
+        finally:
+            server.close()
+            await server.wait_closed()
+            await service.close()
+
+    status, payload = asyncio.run(scenario())
+    assert status == 200
+    assert payload["text"] == run_refinement(DOCUMENT)[1]
+    assert payload["metrics"]["zones"] > 0
+
+
+def test_full_queue_and_timeout():
+    # The only pool thread waits on the gate, so batches pile up behind it
+    gate = threading.Event()
+    executor = ThreadPoolExecutor(1)
+    executor.submit(gate.wait)
+
+    async def scenario():
+        service = RefinementService(workers=1, batch_size=1, queue_size=1, executor=executor)
+        server, port = await _serve(service)
+        try:
+            timed_out = await _post(port, {"text": DOCUMENT, "timeout": 0.1})
+            crowd = await asyncio.gather(*[_post(port, {"text": DOCUMENT, "timeout": 0.5})
+                                           for _ in range(4)])
+            gate.set()
+            done = await _post(port, {"text": DOCUMENT})
+            return timed_out, crowd, done, service.snapshot()
+        finally:
+            gate.set()
+            server.close()
+            await server.wait_closed()
+            await service.close()
+
+    try:
+        timed_out, crowd, done, stats = asyncio.run(scenario())
+    finally:
+        executor.shutdown()
+    assert timed_out[0] == 504
+    statuses = sorted(status for status, _ in crowd)
+    assert 503 in statuses and set(statuses) <= {503, 504}
+    assert done[0] == 200
+    assert stats['rejected'] == statuses.count(503)
+    assert stats['timeouts'] == 1 + statuses.count(504)
+
+
+def test_negative_content_length_is_rejected():
+    async def scenario():
+        service = RefinementService(executor=ThreadPoolExecutor(1))
+        server, port = await _serve(service)
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b"POST /refine HTTP/1.1\r\nContent-Length: -5\r\n\r\n")
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+            return response
+        finally:
+            server.close()
+            await server.wait_closed()
+            await service.close()
+            service.executor.shutdown()
+
+    response = asyncio.run(scenario())
+    assert response.startswith(b"HTTP/1.1 400 ")
+
+
+def test_close_fails_queued_requests():
+    gate = threading.Event()
+    executor = ThreadPoolExecutor(1)
+    executor.submit(gate.wait)
+
+    async def scenario():
+        service = RefinementService(workers=1, batch_size=1, queue_size=8,
+                                    timeout=30, executor=executor)
+        await service.start()
+        requests = [asyncio.ensure_future(service.refine(DOCUMENT)) for _ in range(5)]
+        await asyncio.sleep(0.05)
+        closing = asyncio.ensure_future(service.close())
+        # Queued requests fail at once, not after their 30s timeout
+        done, _ = await asyncio.wait(requests, timeout=1.0)
+        gate.set()
+        await closing
+        await asyncio.gather(*requests, return_exceptions=True)
+        return done, requests
+
+    try:
+        done, requests = asyncio.run(scenario())
+    finally:
+        gate.set()
+        executor.shutdown()
+    failed = [task for task in requests if isinstance(task.exception(), ServiceNotRunning)]
+    assert len(failed) == 3
+    assert set(failed) <= done
+
+
+def test_refine_needs_start():
+    service = RefinementService()
+    with pytest.raises(RuntimeError, match="start"):
+        asyncio.run(service.refine(DOCUMENT))
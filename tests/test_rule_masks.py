@@ -0,0 +1,52 @@
+import random
+
+import pytest
+
+import smart_refiners
+from main_showcase import run_refinement
+from smart_refiners import ALL_CHECKS
+
+WORDS = ["Like", "like", "apples", "pears", "and", "plums", "then", "i", "im", "dont",
+         "my name is", "bob", "but", "so", "yet", "ok", "shopping", "closed", "called",
+         "i am", "Wont", "hello", "the", "store", "we", "went"]
+SEPARATORS = [" ", " ", "  ", "", ". ", ".", ", ", ",,", " ,", "..", "! ", "?", "\n", " . "]
+
+
+def _fragment(rng):
+    if rng.random() < 0.15:
+        # "like a b and c", which the simple_list polish step rewrites
+        return "%s %s %s and %s" % (rng.choice(["Like", "like", "LIKE"]),
+                                    rng.choice(["apples", "pears", "plums"]),
+                                    rng.choice(["pears", "bob", "dont"]),
+                                    rng.choice(["plums", "i", "im"]))
+    return rng.choice(WORDS)
+
+
+def targeted_corpus(count, seed=0):
+    """Short texts packed with the patterns the rules and polish steps fix."""
+    rng = random.Random(seed)
+    return ["".join(_fragment(rng) + rng.choice(SEPARATORS)
+                    for _ in range(rng.randint(1, 25)))
+            for _ in range(count)]
+
+
+def refine_unmasked(monkeypatch, texts, fused):
+    """Refine with every edit clearing all check bits, i.e. no skipped checks."""
+    with monkeypatch.context() as patch:
+        for action in list(smart_refiners.ACTION_REENABLES):
+            patch.setitem(smart_refiners.ACTION_REENABLES, action, ALL_CHECKS)
+        patch.setattr(smart_refiners, "POLISH_STEPS",
+                      tuple((key, step, ALL_CHECKS) for key, step, _ in smart_refiners.POLISH_STEPS))
+        return [run_refinement(text, fused=fused)[1] for text in texts]
+
+
+def test_simple_list_keeps_capitalization():
+    text = "Like apples pears and plums. then ok."
+    assert run_refinement(text)[1] == "Like apples, pears and plums. Then ok."
+
+
+@pytest.mark.parametrize("fused", [False, True])
+def test_masks_match_unmasked_refinement(monkeypatch, fused):
+    texts = ["Like apples pears and plums. then ok."] + targeted_corpus(1500)
+    masked = [run_refinement(text, fused=fused)[1] for text in texts]
+    assert masked == refine_unmasked(monkeypatch, texts, fused)
@@ -0,0 +1,73 @@
+import io
+import random
+import re
+
+import pytest
+
+from zone_manager import iter_sentence_spans, iter_zones
+
+PIECES = ["word", "Word", "x", ".", "!", "?", "...", ",", " ", "  ", "\n", "\n\n", "\t",
+          " \r\n ", "é", " ", "e.g.", "3.14"]
+
+
+def random_text(rng):
+    text = "".join(rng.choice(PIECES) for _ in range(rng.randint(0, 80)))
+    if rng.random() < 0.3:
+        text = rng.choice([" ", "\n ", "\t\t"]) + text
+    if rng.random() < 0.3:
+        text += rng.choice([" ", ". \n", "\n\n"])
+    return text
+
+
+def random_chunks(rng, text):
+    cuts = sorted(rng.sample(range(len(text) + 1), min(len(text) + 1, rng.randint(0, 12))))
+    return [text[start:end] for start, end in zip([0] + cuts, cuts + [len(text)])]
+
+
+def expected_sentences(text):
+    stripped = text.strip()
+    return re.split(r'(?<=[.!?])\s+', stripped) if stripped else []
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_chunkings_match_re_split(seed):
+    rng = random.Random(seed)
+    for _ in range(200):
+        text = random_text(rng)
+        expected = expected_sentences(text)
+        for source in (text, random_chunks(rng, text),
+                       io.StringIO(text)):
+            chunk_size = rng.randint(1, 8)
+            spans = list(iter_sentence_spans(source, chunk_size))
+            assert [sentence for _, sentence in spans] == expected
+            offsets = [offset for offset, _ in spans]
+            assert offsets == sorted(offsets)
+            for offset, sentence in spans:
+                assert text[offset:offset + len(sentence)] == sentence
+
+
+def test_single_character_chunks():
+    text = "  Hello there.  \n How are you?\tFine!  "
+    spans = list(iter_sentence_spans(iter(text)))
+    assert [sentence for _, sentence in spans] == expected_sentences(text)
+    assert [offset for offset, _ in spans] == [2, 18, 31]
+
+
+def test_run_on_sentence_is_cut_while_streaming():
+    words = [f"w{i}," if i % 7 == 0 else f"w{i}" for i in range(5000)]
+    text = " ".join(words)
+    read = []
+
+    def chunks():
+        for start in range(0, len(text), 100):
+            read.append(start)
+            yield text[start:start + 100]
+
+    zones = iter_zones(chunks(), zone_tokens=50)
+    first = next(zones)
+    assert len(read) < 10  # cut before the rest of the sentence was read
+    streamed = [first] + list(zones)
+    whole = list(iter_zones(text, zone_tokens=50))
+    assert ([(z.original_text, z.open_edges) for z in streamed]
+            == [(z.original_text, z.open_edges) for z in whole])
+    assert all(len(z.original_text.split()) <= 50 for z in streamed)
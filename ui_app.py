@@ -1,7 +1,11 @@
+import queue
+import threading
 import tkinter as tk
 from tkinter import scrolledtext
-from main_showcase import run_refinement
 from tkinter import filedialog, messagebox
+from zone_manager import ZoneManager
+from refinement_engine import refine_zones
+from refinement_events import RefinementEvents
 
 
 # ------------------ THEME ------------------
@@ -16,91 +20,166 @@ FONT_MAIN = ("Segoe UI", 11)
 FONT_TITLE = ("Segoe UI", 12, "bold")
 FONT_MONO = ("Consolas", 10)
 
-# ------------------ LOGIC ------------------
-def draw_circular_list(canvas, zones, active_zone=None, refined_zones=None):
-    canvas.delete("all")
-
-    if refined_zones is None:
-        refined_zones = set()
-
-    # ---- Canvas sizing ----
-    width = canvas.winfo_width()
-    if width < 600:
-        width = 600
-
-    node_radius = 28
-    spacing = width // (zones + 1)
-    center_y = 70
+# ------------------ ANIMATION ------------------
+STEP_DELAY_MS = 300     # default delay between animated events
+POLL_MS = 50            # how often to look for events while the worker runs
+SKIP_BATCH = 2000       # events applied per tick when skipping to the end
 
-    forward_arrow_offset = 18   # arrows just below nodes
-    back_arrow_offset = 42      # separate lane for circular arrow
-
-    node_positions = []
-
-    # ---- Draw ALL nodes ----
-    for i in range(zones):
-        x = spacing * (i + 1)
-        y = center_y
-
-        if i + 1 == active_zone:
-            color = "#FBC02D"      # Active
-        elif i + 1 in refined_zones:
-            color = "#2ECC71"      # Refined
-        else:
-            color = "#555555"      # Unvisited
-
-        canvas.create_oval(
-            x - node_radius, y - node_radius,
-            x + node_radius, y + node_radius,
-            fill=color,
+# ------------------ LOGIC ------------------
+NODE_RADIUS = 28
+NODE_SPACING = 80           # minimum distance between node centres
+CENTER_Y = 70
+FORWARD_ARROW_OFFSET = 18   # arrows just below nodes
+BACK_ARROW_OFFSET = 42      # separate lane for circular arrow
+
+COLOR_ACTIVE = "#FBC02D"
+COLOR_REFINED = "#2ECC71"
+COLOR_UNVISITED = "#555555"
+
+
+class CircularListView:
+    """
+    Scrollable drawing of the zone ring.
+    Node items are created only for the nodes in (or near) the visible
+    part of the canvas, once each, and are recoloured in place when a
+    node changes state, so an event costs the same for 5 zones or 50,000.
+    Nodes keep a fixed spacing; the canvas scrolls horizontally and
+    follows the active node.
+    """
+    def __init__(self, canvas, scrollbar):
+        self.canvas = canvas
+        self.scrollbar = scrollbar
+        self.zones = 0
+        self.spacing = NODE_SPACING
+        self.active = None
+        self.refined = set()
+        self.items = {}     # zone -> (oval, label, arrow)
+        canvas.config(xscrollcommand=self._on_scroll)
+        scrollbar.config(command=canvas.xview)
+        canvas.bind("<Configure>", lambda e: self._realize())
+
+    def reset(self, zones):
+        self.canvas.delete("all")
+        self.items = {}
+        self.zones = zones
+        self.active = None
+        self.refined = set()
+
+        width = max(self.canvas.winfo_width(), 600)
+        self.spacing = max(NODE_SPACING, width // (zones + 1))
+        total = self.spacing * (zones + 1)
+        self.canvas.config(scrollregion=(0, 0, total, int(self.canvas["height"])))
+        self.canvas.xview_moveto(0)
+
+        # ---- ONE circular back arrow (Nn -> N1) ----
+        if zones > 1:
+            self.canvas.create_line(
+                self._x(zones), CENTER_Y + BACK_ARROW_OFFSET,
+                self._x(1), CENTER_Y + BACK_ARROW_OFFSET,
+                arrow=tk.LAST,
+                fill="#AAAAAA",
+                width=2
+            )
+
+        # ---- Label ----
+        self.canvas.create_text(
+            width // 2,
+            15,
+            text="next pointer",
+            fill="#777777",
+            font=("Segoe UI", 9)
+        )
+        self._realize()
+
+    def set_active(self, zone):
+        previous, self.active = self.active, zone
+        self._recolor(previous)
+        if zone is not None:
+            self._follow(zone)
+            self._recolor(zone)
+
+    def set_refined(self, zone):
+        self.refined.add(zone)
+        self._recolor(zone)
+
+    # ---- Internals ----
+
+    def _x(self, zone):
+        return self.spacing * zone
+
+    def _color(self, zone):
+        if zone == self.active:
+            return COLOR_ACTIVE
+        if zone in self.refined:
+            return COLOR_REFINED
+        return COLOR_UNVISITED
+
+    def _recolor(self, zone):
+        items = self.items.get(zone)
+        if items is not None:
+            self.canvas.itemconfig(items[0], fill=self._color(zone))
+
+    def _visible_range(self):
+        left = self.canvas.canvasx(0)
+        right = self.canvas.canvasx(max(self.canvas.winfo_width(), 600))
+        first = max(1, int(left // self.spacing))
+        last = min(self.zones, int(right // self.spacing) + 1)
+        return first, last
+
+    def _follow(self, zone):
+        first, last = self._visible_range()
+        if not first <= zone <= last:
+            total = self.spacing * (self.zones + 1)
+            self.canvas.xview_moveto(max(0, self._x(zone) - self.spacing) / total)
+
+    def _on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        self._realize()
+
+    def _realize(self):
+        """Create items for visible nodes; drop those far off-screen."""
+        if not self.zones:
+            return
+        first, last = self._visible_range()
+        for zone in range(first, last + 1):
+            if zone not in self.items:
+                self.items[zone] = self._create_node(zone)
+
+        window = last - first + 1
+        if len(self.items) > 4 * window:
+            keep_from, keep_to = first - window, last + window
+            for zone in [z for z in self.items if not keep_from <= z <= keep_to]:
+                for item in self.items.pop(zone):
+                    if item is not None:
+                        self.canvas.delete(item)
+
+    def _create_node(self, zone):
+        x = self._x(zone)
+        y = CENTER_Y
+        oval = self.canvas.create_oval(
+            x - NODE_RADIUS, y - NODE_RADIUS,
+            x + NODE_RADIUS, y + NODE_RADIUS,
+            fill=self._color(zone),
             outline="#888888",
             width=2
         )
-
-        canvas.create_text(
+        label = self.canvas.create_text(
             x, y,
-            text=f"N{i+1}",
+            text=f"N{zone}",
             fill="black",
             font=("Segoe UI", 10, "bold")
         )
-
-        node_positions.append((x, y))
-
-    # ---- Draw forward arrows (N1 -> N2 -> ... -> Nn) ----
-    for i in range(zones - 1):
-        x1, y1 = node_positions[i]
-        x2, y2 = node_positions[i + 1]
-
-        canvas.create_line(
-            x1 + node_radius, y1 + forward_arrow_offset,
-            x2 - node_radius, y2 + forward_arrow_offset,
-            arrow=tk.LAST,
-            fill="#AAAAAA",
-            width=2
-        )
-
-    # ---- Draw ONE circular back arrow (Nn -> N1) ----
-    if zones > 1:
-        x_start, y_start = node_positions[-1]
-        x_end, y_end = node_positions[0]
-
-        canvas.create_line(
-            x_start, y_start + back_arrow_offset,
-            x_end, y_end + back_arrow_offset,
-            smooth=True,
-            arrow=tk.LAST,
-            fill="#AAAAAA",
-            width=2
-        )
-
-    # ---- Label ----
-    canvas.create_text(
-        width // 2,
-        15,
-        text="next pointer",
-        fill="#777777",
-        font=("Segoe UI", 9)
-    )
+        # ---- Forward arrow (N -> N+1) ----
+        arrow = None
+        if zone < self.zones:
+            arrow = self.canvas.create_line(
+                x + NODE_RADIUS, y + FORWARD_ARROW_OFFSET,
+                self._x(zone + 1) - NODE_RADIUS, y + FORWARD_ARROW_OFFSET,
+                arrow=tk.LAST,
+                fill="#AAAAAA",
+                width=2
+            )
+        return oval, label, arrow
 
 def upload_txt_file():
     file_path = filedialog.askopenfilename(
@@ -128,77 +207,134 @@ def upload_txt_file():
         messagebox.showerror("File Error", f"Could not read file:\n{e}")
 
 
+def refine_in_background(raw_text, updates):
+    """
+    Worker thread: refine ``raw_text`` and feed the traversal events
+    into the ``updates`` queue. Never touches Tk.
+    """
+    try:
+        manager = ZoneManager()
+        zones = manager.split_into_zones(raw_text)
+        updates.put({"event": "start", "zones": zones})
+
+        events = RefinementEvents()
+        events.subscribe(updates.put, ["visit", "refined"])
+        refine_zones(manager, events=events)
+
+        updates.put({
+            "event": "done",
+            "text": manager.get_combined_text(),
+            "metrics": manager.get_metrics()
+        })
+    except Exception as e:
+        updates.put({"event": "error", "error": str(e)})
+
+
+class Animation:
+    """State of one run, advanced by after() callbacks on the Tk thread."""
+    def __init__(self):
+        self.updates = queue.Queue()
+        self.zones = 0
+        self.skip = False
+        self.skipped = 0
+
+
 def run_pipeline():
     input_box.config(state="normal")
     raw_text = input_box.get("1.0", tk.END)
     input_box.config(state="disabled")
-    if not raw_text:
+    if not raw_text.strip():
         return
-    refined_nodes = set()   # 🔴 NEW: track refined nodes visually
-
-
-    logs, final_output, metrics = run_refinement(raw_text)
-    zones_count = metrics["zones"]
-
-    # Initial draw (all nodes unrefined)
-    draw_circular_list(
-        list_canvas,
-        zones=zones_count,
-        active_zone=1,
-        refined_zones=set()
-    )
-    root.update_idletasks()
 
     stages_box.config(state="normal")
     output_box.config(state="normal")
-
     stages_box.delete("1.0", tk.END)
     output_box.delete("1.0", tk.END)
+    output_box.config(state="disabled")
 
-    # --------- ANIMATE CIRCULAR LINKED LIST TRAVERSAL ---------
-    for entry in logs:
+    btn.config(state="disabled")
+    upload_btn.config(state="disabled")
+    skip_btn.config(state="normal")
 
-        # Only process structured traversal logs
-        if isinstance(entry, dict):
+    animation = Animation()
+    skip_btn.config(command=lambda: skip_animation(animation))
+    threading.Thread(
+        target=refine_in_background,
+        args=(raw_text, animation.updates),
+        daemon=True
+    ).start()
+    root.after(POLL_MS, animate, animation)
 
-            # 🔁 Node visit
-            if entry["event"] == "visit":
-                draw_circular_list(
-                    list_canvas,
-                    zones_count,
-                    active_zone=entry["zone"],
-                    refined_zones=refined_nodes
-                )
 
-                stages_box.insert(
-                    tk.END,
-                    f"→ Visiting Node {entry['zone']}\n"
-                )
+def skip_animation(animation):
+    animation.skip = True
+    skip_btn.config(state="disabled")
 
-                root.update()
-                root.after(300)
 
-            # ✅ Node refined
-            elif entry["event"] == "refined":
-                refined_nodes.add(entry["zone"])
+def animate(animation):
+    """Show the next event, then schedule the next step."""
+    budget = SKIP_BATCH if animation.skip else 1
 
-                draw_circular_list(
-                    list_canvas,
-                    zones_count,
-                    active_zone=None,
-                    refined_zones=refined_nodes
-                )
+    while budget:
+        try:
+            entry = animation.updates.get_nowait()
+        except queue.Empty:
+            # Worker still running: look again shortly
+            root.after(POLL_MS, animate, animation)
+            return
 
-                stages_box.insert(
-                    tk.END,
-                    f"✓ Node {entry['zone']} refined — skipping in next cycles\n"
-                )
+        kind = entry["event"]
+        if kind == "start":
+            animation.zones = entry["zones"]
+            list_view.reset(entry["zones"])
+            list_view.set_active(1)
+            continue
+        if kind == "done":
+            finish_pipeline(animation, entry["text"], entry["metrics"])
+            return
+        if kind == "error":
+            stages_box.config(state="disabled")
+            reset_controls()
+            messagebox.showerror("Refinement Error", entry["error"])
+            return
+
+        budget -= 1
+
+        # 🔁 Node visit
+        if kind == "visit":
+            list_view.set_active(entry["zone"])
+            line = f"→ Visiting Node {entry['zone']}\n"
+
+        # ✅ Node refined
+        else:
+            list_view.set_refined(entry["zone"])
+            list_view.set_active(None)
+            line = f"✓ Node {entry['zone']} refined — skipping in next cycles\n"
+
+        if animation.skip:
+            animation.skipped += 1
+        else:
+            stages_box.insert(tk.END, line)
+            stages_box.see(tk.END)
 
-                root.update()
-                root.update_idletasks()
-                root.after(300)
+    if animation.skip:
+        root.after(1, animate, animation)
+    else:
+        root.after(speed_scale.get(), animate, animation)
 
 
+def reset_controls():
+    btn.config(state="normal")
+    upload_btn.config(state="normal")
+    skip_btn.config(state="disabled")
+
+
+def finish_pipeline(animation, final_output, metrics):
+    list_view.set_active(None)
+
+    if animation.skipped:
+        stages_box.insert(tk.END, f"… skipped {animation.skipped:,} traversal steps\n\n")
+
     stages_box.insert(tk.END, "CIRCULAR LINKED LIST NODES\n")
     stages_box.insert(tk.END, "-------------------------\n\n")
 
@@ -221,10 +357,12 @@ def run_pipeline():
         "Only unrefined zones were revisited in each cycle.\n"
     )
 
+    output_box.config(state="normal")
     output_box.insert(tk.END, final_output)
 
     stages_box.config(state="disabled")
     output_box.config(state="disabled")
+    reset_controls()
 
 # ------------------ ROOT ------------------
 root = tk.Tk()
@@ -302,6 +440,38 @@ btn.pack(pady=10)
 btn.bind("<Enter>", lambda e: btn.config(bg="#27AE60"))
 btn.bind("<Leave>", lambda e: btn.config(bg="#2ECC71"))
 
+# ------------------ ANIMATION CONTROLS ------------------
+controls = tk.Frame(root, bg=BG_MAIN)
+controls.pack()
+
+speed_scale = tk.Scale(
+    controls,
+    from_=0,
+    to=1000,
+    resolution=10,
+    orient="horizontal",
+    label="Step delay (ms)",
+    length=220,
+    bg=BG_MAIN,
+    fg=FG_TEXT,
+    highlightthickness=0
+)
+speed_scale.set(STEP_DELAY_MS)
+speed_scale.pack(side="left", padx=8)
+
+skip_btn = tk.Button(
+    controls,
+    text="Skip to End",
+    state="disabled",
+    bg=BTN_BG,
+    fg=FG_TEXT,
+    font=("Segoe UI", 10, "bold"),
+    relief="flat",
+    padx=12,
+    pady=4
+)
+skip_btn.pack(side="left", padx=8)
+
 # ------------------ OUTPUT PANELS ------------------
 panel = tk.Frame(root, bg=BG_MAIN)
 panel.pack(fill="both", expand=True, padx=12, pady=10)
@@ -331,6 +501,10 @@ list_canvas = tk.Canvas(
 )
 list_canvas.pack(fill="x")
 
+list_scrollbar = tk.Scrollbar(canvas_frame, orient="horizontal")
+list_scrollbar.pack(fill="x")
+list_view = CircularListView(list_canvas, list_scrollbar)
+
 tk.Label(
     left,
     text="Refinement STAGES:-",
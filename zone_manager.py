@@ -1,5 +1,336 @@
+import gzip
+import itertools
+import json
+import os
 import re
+import zlib
+from collections import deque
 from zone_node import ZoneNode
+from smart_refiners import RuleStats, PROCESS_RULE_STATS, RULESET_VERSION
+
+SENTENCE_BOUNDARY_RE = re.compile(r'(?<=[.!?])\s+')
+WORD_RE = re.compile(r'\S+')
+CLAUSE_END = (',', ';', ':')
+STREAM_CHUNK_SIZE = 1 << 16
+
+
+def _iter_chunks(source, chunk_size):
+    if isinstance(source, str):
+        return [source]
+    if hasattr(source, "read"):
+        return iter(lambda: source.read(chunk_size), "")
+    return source
+
+
+def iter_sentences(source, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Yield sentences from a string, file object or iterable of chunks.
+    Matches re.split(SENTENCE_BOUNDARY_RE, text.strip()) on the full text,
+    but only holds the current unfinished sentence in memory.
+    """
+    for _, sentence, _ in _iter_sentence_pieces(source, chunk_size):
+        yield sentence
+
+
+def iter_sentence_spans(source, chunk_size=STREAM_CHUNK_SIZE):
+    """Like iter_sentences, yielding (offset in the input, sentence) pairs."""
+    for offset, sentence, _ in _iter_sentence_pieces(source, chunk_size):
+        yield offset, sentence
+
+
+def _iter_sentence_pieces(source, chunk_size, max_words=None):
+    """
+    Yield (offset, sentence, open_edges). With ``max_words``, a run-on
+    sentence is cut while it is read, as soon as the buffer holds more
+    than that many of its words, into the pieces _sentence_pieces would
+    cut (the rest follows with a "start" edge), so an unpunctuated input
+    is never held in memory whole.
+    """
+    buffer = ""
+    base = 0  # input offset of buffer[0]
+    scan_from = 0
+    started = False
+    continued = False  # pieces of the unfinished sentence already yielded
+    for chunk in _iter_chunks(source, chunk_size):
+        buffer += chunk
+        if not started:
+            stripped = buffer.lstrip()
+            base += len(buffer) - len(stripped)
+            buffer = stripped
+            started = bool(buffer)
+
+        start = 0
+        held = None
+        for match in SENTENCE_BOUNDARY_RE.finditer(buffer, scan_from):
+            if match.end() == len(buffer):
+                # The whitespace run may continue in the next chunk
+                held = match
+                break
+            sentence = buffer[start:match.start()]
+            if sentence.strip():
+                yield base + start, sentence, ("start",) if continued else ()
+                continued = False
+            start = match.end()
+
+        buffer = buffer[start:]
+        base += start
+        scan_from = held.start() - start if held else len(buffer)
+
+        if max_words and len(buffer) > 2 * max_words:
+            words = [match.span() for match in WORD_RE.finditer(buffer)]
+            if words and words[-1][1] == len(buffer):
+                words.pop()  # may continue in the next chunk
+            first = 0
+            while len(words) - first > max_words:
+                cut = _piece_end(buffer, words, first, max_words)
+                begin = words[first][0]
+                yield (base + begin, buffer[begin:words[cut - 1][1]],
+                       ("start", "end") if continued else ("end",))
+                continued = True
+                first = cut
+            if first:
+                drop = words[first][0]
+                buffer = buffer[drop:]
+                base += drop
+                scan_from -= drop
+
+    buffer = buffer.rstrip()
+    start = 0
+    for match in SENTENCE_BOUNDARY_RE.finditer(buffer):
+        sentence = buffer[start:match.start()]
+        if sentence.strip():
+            yield base + start, sentence, ("start",) if continued else ()
+            continued = False
+        start = match.end()
+    if buffer[start:].strip():
+        yield base + start, buffer[start:], ("start",) if continued else ()
+
+
+def _piece_end(sentence, words, first, max_tokens):
+    """Index of the word after the piece of ``sentence`` starting at words[first]."""
+    cut = first + max_tokens
+    # Last clause end in the window, unless it leaves a tiny piece
+    shortest = max(1, max_tokens // 2)
+    for i in range(cut - 1, first + shortest - 2, -1):
+        if sentence[words[i][1] - 1] in CLAUSE_END:
+            return i + 1
+    return cut
+
+
+def _sentence_pieces(offset, sentence, max_tokens, continued=False):
+    """
+    Cut a sentence of more than ``max_tokens`` words into pieces of at
+    most that many, preferably after a comma, semicolon or colon, else
+    between words. ``continued`` when earlier pieces of it were already
+    cut off. Yields (offset, piece, open_edges).
+    """
+    words = [match.span() for match in WORD_RE.finditer(sentence)]
+    first = 0
+    while len(words) - first > max_tokens:
+        cut = _piece_end(sentence, words, first, max_tokens)
+        edges = ("start", "end") if first or continued else ("end",)
+        begin = words[first][0]
+        yield offset + begin, sentence[begin:words[cut - 1][1]], edges
+        first = cut
+    begin = words[first][0] if first else 0
+    yield offset + begin, sentence[begin:], ("start",) if first or continued else ()
+
+
+def _budget_zone_spans(spans, zone_tokens):
+    """
+    Group sentences into zones of about ``zone_tokens`` words: short
+    sentences are merged until the next one would overflow the budget,
+    and run-on sentences are split across zones. A zone at least half
+    full also ends after a sentence whose last piece _ends_zone picks.
+    Takes and yields (offset, text, open_edges).
+    """
+    group = []
+    group_tokens = 0
+    for offset, sentence, edges in spans:
+        tokens = len(sentence.split())
+        if tokens > zone_tokens:
+            pieces = _sentence_pieces(offset, sentence, zone_tokens, "start" in edges)
+        else:
+            pieces = ((offset, sentence, edges),)
+        for piece in pieces:
+            if piece[1] is not sentence:
+                tokens = len(piece[1].split())
+            if group and group_tokens + tokens > zone_tokens:
+                yield _join_group(group)
+                group = []
+                group_tokens = 0
+            group.append(piece)
+            group_tokens += tokens
+        if ("end" not in piece[2] and group_tokens * 2 >= zone_tokens
+                and _ends_zone(piece[1])):
+            yield _join_group(group)
+            group = []
+            group_tokens = 0
+    if group:
+        yield _join_group(group)
+
+
+def _join_group(group):
+    edges = tuple(edge for edge, piece in (("start", group[0]), ("end", group[-1]))
+                  if edge in piece[2])
+    return group[0][0], " ".join(piece[1] for piece in group), edges
+
+
+def _ends_zone(sentence):
+    """
+    Content-defined zone boundary: about half of all sentences may end a
+    zone, picked by a hash of their own text, so where zones start and
+    end depends on the sentences and not on their position. An edit only
+    regroups the sentences up to the next boundary both versions share.
+    """
+    return not zlib.crc32(sentence.encode("utf-8", "surrogatepass")) & 1
+
+
+def iter_zones(source, chunk_size=STREAM_CHUNK_SIZE, zone_tokens=None):
+    """
+    Yield ZoneNodes as soon as their sentences have been read.
+    Zone sizing needs at most the first 6 sentences to be known, and the
+    zone type one zone of lookahead, so memory stays bounded by the zone
+    size (plus the longest sentence). The nodes are not linked.
+    With ``zone_tokens``, zones are instead sized to about that many
+    words each (see _budget_zone_spans) for evenly sized units of work,
+    and run-on sentences are cut as they are read, so memory stays
+    bounded by the budget even for unpunctuated input.
+    When ``source`` is a string, zones whose text appears verbatim in it
+    keep their original text as offsets into ``source``.
+    """
+    buffer = source if isinstance(source, str) else None
+
+    # ---- Adaptive zone sizing ----
+    def zone_spans():
+        spans = _iter_sentence_pieces(source, chunk_size)
+        head = []
+        for span in spans:
+            head.append(span)
+            if len(head) > 5:
+                break
+
+        num_sentences = len(head)
+        if num_sentences <= 2:
+            zone_size = num_sentences        # 1 zone
+        elif num_sentences <= 5:
+            zone_size = 2                    # small paragraph
+        else:
+            zone_size = None                 # large paragraph: 2-4 sentences
+
+        group = []
+        for span in itertools.chain(head, spans):
+            group.append(span)
+            if zone_size is not None:
+                full = len(group) == zone_size
+            else:
+                full = len(group) == 4 or (len(group) >= 2 and _ends_zone(span[1]))
+            if full:
+                yield group[0][0], " ".join(span[1] for span in group), ()
+                group = []
+        if group:
+            yield group[0][0], " ".join(span[1] for span in group), ()
+
+    def make_node(zone_id, start, zone_text, open_edges, zone_type):
+        if buffer is not None and buffer.startswith(zone_text, start):
+            node = ZoneNode(zone_id, zone_text, zone_type, source=buffer, start=start)
+        else:
+            node = ZoneNode(zone_id, zone_text, zone_type)
+        node.open_edges = open_edges
+        return node
+
+    if zone_tokens:
+        zone_tokens = max(1, zone_tokens)
+        zones = _budget_zone_spans(
+            _iter_sentence_pieces(source, chunk_size, zone_tokens), zone_tokens)
+    else:
+        zones = zone_spans()
+
+    # ---- Create zone nodes (one zone behind, to spot the last one) ----
+    pending = None
+    zone_id = 0
+    for zone in zones:
+        if pending is not None:
+            zone_type = "intro" if zone_id == 1 else "body"
+            yield make_node(zone_id, *pending, zone_type)
+        pending = zone
+        zone_id += 1
+
+    if pending is not None:
+        zone_type = "intro" if zone_id == 1 else "conclusion"
+        yield make_node(zone_id, *pending, zone_type)
+
+
+class ZoneMetrics:
+    """
+    Running totals behind ZoneManager.get_metrics, fed one zone at a time
+    so streamed documents can be summarized without keeping their zones.
+    """
+    def __init__(self):
+        self.zones = 0
+        self.total_changes = 0
+        self.total_passes = 0
+        self.total_tokens = 0
+        self.max_passes = 0
+        self.actual_tokens = 0
+        self.tokens_processed = 0
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.fixed_points = 0
+        self.oscillations = 0
+
+    def add(self, zone):
+        tokens = zone.count_tokens()
+        self.zones += 1
+        self.total_changes += zone.changes_made
+        self.total_passes += zone.refinement_passes
+        self.total_tokens += tokens
+        self.max_passes = max(self.max_passes, zone.refinement_passes)
+        # Actual tokens processed (only zones that needed work)
+        self.actual_tokens += tokens * zone.refinement_passes
+        # Measured work, as opposed to the estimates above
+        self.tokens_processed += zone.tokens_processed
+        self.wall_time += zone.wall_time
+        self.cpu_time += zone.cpu_time
+        # Zones retired early because refinement stopped making progress
+        if zone.stall == "fixed point":
+            self.fixed_points += 1
+        elif zone.stall == "oscillation":
+            self.oscillations += 1
+
+    def as_dict(self):
+        # Tokens that would be processed in traditional approach
+        # (re-process entire text each time)
+        traditional_tokens = self.total_tokens * max(1, self.max_passes)
+        actual_tokens = self.actual_tokens
+
+        efficiency_gain = 0
+        if traditional_tokens > 0:
+            efficiency_gain = ((traditional_tokens - actual_tokens) / traditional_tokens) * 100
+
+        return {
+            'zones': self.zones,
+            'total_changes': self.total_changes,
+            'total_passes': self.total_passes,
+            'tokens_traditional': traditional_tokens,
+            'tokens_actual': actual_tokens,
+            'efficiency_gain': efficiency_gain,
+            'tokens_processed': self.tokens_processed,
+            'zone_wall_seconds': self.wall_time,
+            'zone_cpu_seconds': self.cpu_time,
+            'stalled_zones': self.fixed_points + self.oscillations,
+            'fixed_points': self.fixed_points,
+            'oscillations': self.oscillations
+        }
+
+
+CHECKPOINT_VERSION = 3
+
+
+def _empty_run_stats():
+    return {'cycles': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'cycle_times': [],
+            'budget': None, 'backend_input_tokens': 0, 'backend_output_tokens': 0}
+
 
 class ZoneManager:
     """
@@ -11,53 +342,34 @@ class ZoneManager:
         self.zones = []
         self.total_tokens_processed = 0
         self.total_passes = 0
+        self.rule_stats = RuleStats()
+        self.run_stats = _empty_run_stats()
+        self.zone_tokens = None
         
-    def split_into_zones(self, text):
-
-        # ---- Reset state ----
-        self.zones = []
-        self.head = None
-
+    def split_into_zones(self, text, zone_tokens=None):
         """
         Split text into logical zones
         Sentences are grouped into meaningful chunks so that
         node count scales with structure, not raw sentence count.
+        ``zone_tokens`` sizes zones by a word budget instead.
         """
+        return self.split_stream(text, zone_tokens=zone_tokens)
 
-        # ---- Sentence split ----
-        sentences = re.split(r'(?<=[.!?])\s+', text.strip())
-        sentences = [s for s in sentences if s.strip()]  # safety clean
-
-        num_sentences = len(sentences)
-
-        # ---- Adaptive zone sizing ----
-        if num_sentences <= 2:
-            zone_size = num_sentences        # 1 zone
-        elif num_sentences <= 5:
-            zone_size = 2                    # small paragraph
-        else:
-            zone_size = 3                    # large paragraph
-
-        zones_text = []
+    def split_stream(self, source, chunk_size=STREAM_CHUNK_SIZE, zone_tokens=None):
+        """
+        Build the circular linked list from a string, file object or
+        iterable of text chunks, linking nodes as the splitter yields them.
+        """
 
-        # ---- Group sentences into zones ----
-        for i in range(0, num_sentences, zone_size):
-            zone_text = " ".join(sentences[i:i + zone_size])
-            if zone_text.strip():
-                zones_text.append(zone_text)
+        # ---- Reset state ----
+        self.zones = []
+        self.head = None
+        self.rule_stats = RuleStats()
+        self.run_stats = _empty_run_stats()
+        self.zone_tokens = zone_tokens  # reused by update_text
 
-        # ---- Create zone nodes ----
         prev_node = None
-
-        for i, zone_text in enumerate(zones_text):
-            if i == 0:
-                zone_type = "intro"
-            elif i == len(zones_text) - 1:
-                zone_type = "conclusion"
-            else:
-                zone_type = "body"
-
-            node = ZoneNode(i + 1, zone_text, zone_type)
+        for node in iter_zones(source, chunk_size, zone_tokens):
             self.zones.append(node)
 
             if prev_node:
@@ -73,7 +385,144 @@ class ZoneManager:
 
         return len(self.zones)
 
-    
+    def update_text(self, text):
+        """
+        Re-split an edited document, reusing refined work.
+        New zones whose original text and type hash the same as a finished
+        (refined or stalled) zone of the previous version take over its
+        text, counters and stall state; the rest start fresh. Zone
+        boundaries depend only on the sentences around them (see
+        _ends_zone), so an inserted or removed sentence only regroups its
+        neighbours, and the result is the same as refining the new text
+        from scratch. The document is re-split with the same zone budget
+        as before. Returns the zones that still need refining.
+        """
+        finished = {}
+        for zone in self.zones:
+            if zone.is_refined or zone.stall is not None:
+                finished.setdefault(zone.content_hash(), deque()).append(zone)
+
+        # Rule counters keep adding up over the document's versions
+        rule_stats = self.rule_stats
+        self.split_into_zones(text, self.zone_tokens)
+        self.rule_stats = rule_stats
+
+        pending = []
+        for zone in self.zones:
+            matches = finished.get(zone.content_hash()) if finished else None
+            if not matches:
+                pending.append(zone)
+                continue
+            old = matches.popleft()
+            zone.text = old.text
+            zone.refinement_passes = old.refinement_passes
+            zone.changes_made = old.changes_made
+            zone.tokens_processed = old.tokens_processed
+            zone.wall_time = old.wall_time
+            zone.cpu_time = old.cpu_time
+            zone.is_refined = old.is_refined
+            zone.stall = old.stall
+
+        return pending
+
+    # ---- Checkpoints ----
+    def write_checkpoint(self, path, cycle=0, pending=None, visited=(), fused=False,
+                         source=None, complete=False):
+        """
+        Snapshot the zones to ``path``: gzipped JSON lines, a header then
+        one line per zone with its text, counters, refined flag and place
+        in the scheduler (``pending`` zones, of which ``visited`` were
+        already visited in the cycle after ``cycle`` completed ones).
+        ``source`` (any JSON value) identifies the input the run refines,
+        so a resume can refuse a snapshot of another input; ``complete``
+        marks the snapshot of a finished run. The header records
+        RULESET_VERSION, as zones' rule_mask bits are positions in RULES.
+        Written to a temporary file and renamed, so a crash mid-write
+        leaves the previous snapshot intact.
+        """
+        pending = set(self.zones if pending is None else pending)
+        visited = set(visited)
+        header = {'version': CHECKPOINT_VERSION, 'cycle': cycle, 'fused': fused,
+                  'zone_tokens': self.zone_tokens, 'zones': len(self.zones),
+                  'source': source, 'complete': complete, 'ruleset': RULESET_VERSION}
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=1, mtime=0) as fp:
+                fp.write(json.dumps(header).encode() + b"\n")
+                for zone in self.zones:
+                    text = zone.text
+                    original = zone.original_text
+                    row = [zone.zone_id, zone.zone_type, text,
+                           None if original == text else original,
+                           zone.refinement_passes, zone.changes_made,
+                           zone.tokens_processed, zone.is_refined,
+                           list(zone.open_edges), zone.stall,
+                           [digest.hex() for digest in zone.text_hashes],
+                           zone.rule_mask, zone.wall_time, zone.cpu_time,
+                           zone in pending, zone in visited]
+                    fp.write(json.dumps(row, ensure_ascii=False).encode("utf-8", "surrogatepass"))
+                    fp.write(b"\n")
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(tmp, path)
+
+    @classmethod
+    def read_checkpoint(cls, path):
+        """
+        Load a snapshot written by write_checkpoint. Returns the manager
+        and the run state: 'cycle', 'fused', 'source', 'complete',
+        'pending' (zones, in document order) and 'visited' (a set of zones).
+        """
+        manager = cls()
+        pending = []
+        visited = set()
+        with gzip.open(path, "rb") as fp:
+            header = json.loads(fp.readline())
+            if header.get('version') != CHECKPOINT_VERSION:
+                raise ValueError(f"Unsupported checkpoint version: {header.get('version')}")
+            if header.get('ruleset') != RULESET_VERSION:
+                # Its rule_mask bits would skip the wrong checks
+                raise ValueError(f"Checkpoint {path} was written for ruleset "
+                                 f"{header.get('ruleset')}, not {RULESET_VERSION}")
+            prev_node = None
+            for line in fp:
+                (zone_id, zone_type, text, original, passes, changes, tokens,
+                 refined, open_edges, stall, text_hashes, rule_mask, wall, cpu,
+                 is_pending, is_visited) = json.loads(line.decode("utf-8", "surrogatepass"))
+                node = ZoneNode(zone_id, text if original is None else original, zone_type)
+                node.text = text
+                node.refinement_passes = passes
+                node.changes_made = changes
+                node.tokens_processed = tokens
+                node.is_refined = refined
+                node.open_edges = tuple(open_edges)
+                node.stall = stall
+                node.text_hashes = tuple(bytes.fromhex(digest) for digest in text_hashes)
+                node.rule_mask = rule_mask
+                node.wall_time = wall
+                node.cpu_time = cpu
+                if is_pending:
+                    pending.append(node)
+                if is_visited:
+                    visited.add(node)
+
+                manager.zones.append(node)
+                if prev_node:
+                    prev_node.next = node
+                else:
+                    manager.head = node
+                prev_node = node
+
+        if len(manager.zones) != header['zones']:
+            raise ValueError(f"Truncated checkpoint: {len(manager.zones)} of {header['zones']} zones")
+        if prev_node:
+            prev_node.next = manager.head
+        manager.zone_tokens = header['zone_tokens']
+        state = {'cycle': header['cycle'], 'fused': header['fused'],
+                 'source': header['source'], 'complete': header['complete'],
+                 'pending': pending, 'visited': visited}
+        return manager, state
+
     def get_all_zones(self):
         """Return all zones as a list"""
         return self.zones
@@ -81,32 +530,61 @@ class ZoneManager:
     def get_combined_text(self):
         """Reconstruct text from all zones"""
         return ' '.join(zone.text for zone in self.zones)
+
+    def iter_combined_text(self, chunk_size=STREAM_CHUNK_SIZE):
+        """
+        Yield the combined text in pieces of about ``chunk_size``
+        characters, so it never has to exist as one string.
+        """
+        parts = []
+        size = 0
+        for zone in self.zones:
+            if zone is not self.head:
+                parts.append(' ')
+            text = zone.text
+            parts.append(text)
+            size += len(text) + 1
+            if size >= chunk_size:
+                yield ''.join(parts)
+                parts = []
+                size = 0
+        if parts:
+            yield ''.join(parts)
+
+    def write_combined_text(self, fp, chunk_size=STREAM_CHUNK_SIZE):
+        """
+        Write the combined text to ``fp`` (a text file, or a socket's
+        makefile("w")) in chunks. Returns the number of characters written.
+        """
+        written = 0
+        for chunk in self.iter_combined_text(chunk_size):
+            fp.write(chunk)
+            written += len(chunk)
+        return written
     
-    def get_metrics(self):
-        """Get efficiency metrics"""
-        total_changes = sum(zone.changes_made for zone in self.zones)
-        total_passes = sum(zone.refinement_passes for zone in self.zones)
-        total_tokens = sum(zone.count_tokens() for zone in self.zones)
-        
-        # Calculate tokens that would be processed in traditional approach
-        # (re-process entire text each time)
-        traditional_tokens = total_tokens * max(1, max(z.refinement_passes for z in self.zones) if self.zones else 0)
-        
-        # Calculate actual tokens processed (only zones that needed work)
-        actual_tokens = sum(zone.count_tokens() * zone.refinement_passes for zone in self.zones)
-        
-        efficiency_gain = 0
-        if traditional_tokens > 0:
-            efficiency_gain = ((traditional_tokens - actual_tokens) / traditional_tokens) * 100
-        
-        return {
-            'zones': len(self.zones),
-            'total_changes': total_changes,
-            'total_passes': total_passes,
-            'tokens_traditional': traditional_tokens,
-            'tokens_actual': actual_tokens,
-            'efficiency_gain': efficiency_gain
-        }
+    def get_metrics(self, process=False):
+        """
+        Get efficiency metrics, with this document's per-rule counters
+        under 'rules' (and the whole process's under 'rules_process').
+        Measured costs: the characters and tokens handed to each refiner
+        stage ('scanned'), and the last run's cycle count and wall/CPU
+        seconds, per cycle in 'cycle_times'. The token fields count words;
+        'backend_input_tokens' and 'backend_output_tokens' are the last
+        run's usage as its backend reported it (0 without one).
+        """
+        metrics = ZoneMetrics()
+        for zone in self.zones:
+            metrics.add(zone)
+        result = metrics.as_dict()
+        result.update(self.run_stats)
+        scanned = self.rule_stats.scanned_dict()
+        result['scanned'] = scanned
+        result['chars_scanned'] = sum(stage['chars'] for stage in scanned.values())
+        result['tokens_scanned'] = sum(stage['tokens'] for stage in scanned.values())
+        result['rules'] = self.rule_stats.as_dict()
+        if process:
+            result['rules_process'] = PROCESS_RULE_STATS.as_dict()
+        return result
     
     def get_zone_details(self):
         """Get per-zone refinement details"""
@@ -118,6 +596,10 @@ class ZoneManager:
                 'passes': zone.refinement_passes,
                 'changes': zone.changes_made,
                 'tokens': zone.count_tokens(),
-                'refined': zone.is_refined
+                'tokens_processed': zone.tokens_processed,
+                'wall_seconds': zone.wall_time,
+                'cpu_seconds': zone.cpu_time,
+                'refined': zone.is_refined,
+                'stall': zone.stall
             })
         return details
\ No newline at end of file
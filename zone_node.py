@@ -1,18 +1,94 @@
+import hashlib
+
+
+def count_tokens(text):
+    """Simple token count (words), used by every token metric"""
+    return len(text.split())
+
+
 class ZoneNode:
     """
     Represents a text zone (segment) in the refinement system.
     Each zone tracks its own refinement state and metrics.
+    Slot-based: zones are created by the million for large corpora.
     """
-    def __init__(self, zone_id, text, zone_type="body"):
+    __slots__ = (
+        "zone_id", "zone_type", "_text", "_token_count",
+        "_original", "_source", "_start", "_end",
+        "refinement_passes", "changes_made", "is_refined",
+        "next", "next_pending", "tokens_processed",
+        "wall_time", "cpu_time", "open_edges", "stall", "text_hashes",
+        "rule_mask",
+    )
+
+    def __init__(self, zone_id, text, zone_type="body", source=None, start=None):
+        """
+        When ``source`` is given, ``text`` must equal source[start:start + len(text)];
+        the zone then holds offsets into ``source`` instead of a string,
+        for its original text and for its text until the first edit.
+        """
         self.zone_id = zone_id
-        self.text = text
         self.zone_type = zone_type  # "intro", "body", "conclusion"
-        self.original_text = text
+        if source is None:
+            self.text = text
+            self.original_text = text
+        else:
+            self._original = None
+            self._source = source
+            self._start = start
+            self._end = start + len(text)
+            self.text = None
         self.refinement_passes = 0
         self.changes_made = 0
         self.is_refined = False
         self.next = None
+        self.next_pending = None  # link in the scheduler's ring of pending zones
         self.tokens_processed = 0
+        self.wall_time = 0.0  # seconds spent in this zone's visits
+        self.cpu_time = 0.0
+        # "start" / "end" when the zone begins / stops mid-sentence
+        # (a long sentence split across zones)
+        self.open_edges = ()
+        # Set to "fixed point" / "oscillation" when refinement stopped
+        # making progress; text_hashes are the texts seen on the way
+        self.stall = None
+        self.text_hashes = ()
+
+    @property
+    def text(self):
+        if self._text is None:
+            # Unedited: a transient slice of the shared source
+            return self._source[self._start:self._end]
+        return self._text
+
+    @text.setter
+    def text(self, value):
+        # An edit gives the zone its own string in place of the span
+        self._text = value
+        self._token_count = None  # recounted on demand
+        self.rule_mask = 0  # no checks known to pass on the new text
+
+    @property
+    def original_text(self):
+        if self._original is None:
+            return self._source[self._start:self._end]
+        return self._original
+
+    @original_text.setter
+    def original_text(self, value):
+        if self._text is None:
+            self._text = self.original_text
+        self._original = value
+        self._source = None
+        self._start = self._end = None
+        
+    def content_hash(self):
+        """Digest of the zone type and original text, for reuse across edits"""
+        key = f"{self.zone_type}\0{self.original_text}"
+        if self.open_edges:
+            key += "\0" + ",".join(self.open_edges)
+        key = key.encode("utf-8", "surrogatepass")
+        return hashlib.blake2b(key, digest_size=16).digest()
         
     def mark_change(self):
         """Track that a change was made in this zone"""
@@ -23,8 +99,10 @@ class ZoneNode:
         self.refinement_passes += 1
         
     def count_tokens(self):
-        """Simple token count (words)"""
-        return len(self.text.split())
+        """Simple token count (words), cached until the text changes"""
+        if self._token_count is None:
+            self._token_count = count_tokens(self.text)
+        return self._token_count
     
     def __str__(self):
-        return f"Zone {self.zone_id} ({self.zone_type}): {len(self.text)} chars, {self.refinement_passes} passes"
\ No newline at end of file
+        return f"Zone {self.zone_id} ({self.zone_type}): {len(self.text)} chars, {self.refinement_passes} passes"
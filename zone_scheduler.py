@@ -0,0 +1,80 @@
+class ActiveRing:
+    """
+    Scheduler for zones that still need work.
+    Pending zones form a second ring threaded through ZoneNode.next_pending,
+    built by walking the document's circular list. A sweep visits only the
+    pending zones, in document order, and a zone retired during the sweep
+    is unlinked in O(1). The document ring (``next``) is never modified.
+    """
+    def __init__(self, zones=()):
+        self.tail = None
+        self.size = 0
+        self.cycle = 0
+        self._current = None
+        self._retire_current = False
+        for zone in zones:
+            self._append(zone)
+
+    @classmethod
+    def from_head(cls, head):
+        """Build the ring by following ``next`` pointers from ``head``."""
+        ring = cls()
+        zone = head
+        while zone is not None:
+            ring._append(zone)
+            zone = zone.next
+            if zone is head:
+                break
+        return ring
+
+    def _append(self, zone):
+        if self.tail is None:
+            zone.next_pending = zone
+        else:
+            zone.next_pending = self.tail.next_pending
+            self.tail.next_pending = zone
+        self.tail = zone
+        self.size += 1
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        """The pending zones in document order, without starting a cycle."""
+        zone = self.tail
+        for _ in range(self.size):
+            zone = zone.next_pending
+            yield zone
+
+    def sweep(self):
+        """
+        Run one cycle: yield every pending zone once, in document order.
+        Call retire(zone) on the yielded zone to drop it from the ring.
+        """
+        self.cycle += 1
+        prev = self.tail
+        for _ in range(self.size):
+            zone = prev.next_pending
+            self._current = zone
+            self._retire_current = False
+            yield zone
+
+            if self._retire_current:
+                # ---- O(1) unlink ----
+                if self.size == 1:
+                    self.tail = None
+                else:
+                    prev.next_pending = zone.next_pending
+                    if zone is self.tail:
+                        self.tail = prev
+                zone.next_pending = None
+                self.size -= 1
+            else:
+                prev = zone
+        self._current = None
+
+    def retire(self, zone):
+        """Unlink ``zone`` (the zone the current sweep just yielded)."""
+        if zone is not self._current:
+            raise ValueError("Only the zone being visited can be retired")
+        self._retire_current = True